@@ -0,0 +1,6 @@
+"""Headless dubbing engine shared by the Tk app and the command line"""
+
+from .events import EventBus, EventQueue, Throttle
+from .pipeline import DubbingJob, DubbingPipeline
+
+__all__ = ["DubbingJob", "DubbingPipeline", "EventBus", "EventQueue", "Throttle"]
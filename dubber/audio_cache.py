@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import threading
+
+from .paths import write_atomic
+
+
+class AudioCache:
+    """Content-addressed store for synthesized segments with a byte budget
+
+    Entries are named by a hash of everything that affects the audio, so any
+    job that needs the same line with the same voice reuses the file. Reads
+    refresh the file's mtime and eviction removes the oldest files first.
+    """
+
+    def __init__(self, root, max_bytes=2 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def make_key(engine, voice, lang, text, sample_rate):
+        payload = json.dumps([engine, voice, lang, text, sample_rate], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path_for(self, key, ext="mp3"):
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def get(self, key, ext="mp3"):
+        """Return the cached bytes for key, or None on a miss"""
+        path = self.path_for(key, ext)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data, ext="mp3"):
+        """Store bytes for key; concurrent writers of one key are harmless"""
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, data)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its byte budget"""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue  # another writer's file in progress
+                path = os.path.join(dirpath, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
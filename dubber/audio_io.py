@@ -0,0 +1,40 @@
+import io
+import subprocess
+
+SAMPLE_RATE = 44100
+
+
+# Leading bytes of the encoded formats TTS backends return, and their file extensions
+AUDIO_SIGNATURES = [(b'RIFF', 'wav'), (b'fLaC', 'flac'), (b'OggS', 'ogg')]
+
+
+def audio_extension(data):
+    """File extension for encoded audio bytes; MP3 unless the header says otherwise"""
+    for signature, ext in AUDIO_SIGNATURES:
+        if data.startswith(signature):
+            return ext
+    return 'mp3'
+
+
+def decode_with_ffmpeg(data, sample_rate=SAMPLE_RATE):
+    """Decode through an ffmpeg pipe, for formats libsndfile cannot read"""
+    import numpy as np
+
+    result = subprocess.run([
+        'ffmpeg', '-loglevel', 'error', '-i', 'pipe:0',
+        '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'
+    ], input=data, capture_output=True, check=True)
+    return np.frombuffer(result.stdout, dtype=np.float32)
+
+
+def decode_audio(data, sample_rate=SAMPLE_RATE):
+    """Decode encoded audio bytes (MP3, WAV, ...) to mono float32 at sample_rate, in memory"""
+    import soundfile as sf
+    from .mixer import resample, to_mono
+
+    try:
+        samples, rate = sf.read(io.BytesIO(data), dtype='float32')
+    except sf.LibsndfileError:
+        # libsndfile older than 1.1 has no MP3 support
+        return decode_with_ffmpeg(data, sample_rate)
+    return resample(to_mono(samples), rate, sample_rate)
@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+
+
+def expand_url(url, ydl=None, on_skip=None):
+    """(video URL, video id) for every video behind url
+
+    Nothing is fully extracted here; the jobs do that in parallel. A URL
+    yt-dlp knows to be a single video is taken with the id in it, anything
+    else is read with yt-dlp's flat extraction, which reads only the listing
+    pages, not every video's page. A channel lists its tabs (videos, shorts,
+    live), and those are expanded in turn. Entries without an id cannot be
+    told apart or archived, so they are passed to on_skip and left out.
+    """
+    import yt_dlp
+
+    if ydl is None:
+        with yt_dlp.YoutubeDL({'extract_flat': True, 'quiet': True}) as ydl:
+            return expand_url(url, ydl, on_skip)
+
+    video_id = _single_video_id(url)
+    if video_id:
+        return [(url, video_id)]
+    try:
+        info = ydl.extract_info(url, download=False)
+    except Exception as e:
+        raise Exception(f"Error listing {url}: {str(e)}")
+    if info.get('_type') in ('url', 'url_transparent') and info.get('url') != url:
+        return expand_url(info['url'], ydl, on_skip)
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        if not info.get('id'):
+            raise Exception(f"Error listing {url}: no video id")
+        return [(info.get('webpage_url') or url, info['id'])]
+    return _expand_entries(info, ydl, on_skip)
+
+
+def _expand_entries(info, ydl, on_skip):
+    videos = []
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue  # unavailable or private videos
+        entry_url = entry.get('url') or entry.get('webpage_url')
+        if entry.get('_type') in ('playlist', 'multi_video'):
+            videos += _expand_entries(entry, ydl, on_skip)
+            continue
+        video_id = entry_url and _single_video_id(entry_url, entry.get('ie_key'))
+        if entry_url and not video_id:
+            # A nested playlist, or a URL yt-dlp cannot place without reading it
+            videos += expand_url(entry_url, ydl, on_skip)
+        elif entry_url:
+            videos.append((entry_url, entry.get('id') or video_id))
+        elif on_skip:
+            on_skip(entry.get('title') or entry_url or info.get('id') or '?')
+    return videos
+
+
+def _single_video_id(url, ie_key=None):
+    """The video id in url if yt-dlp knows, without reading it, that url is a single video"""
+    from yt_dlp.extractor import gen_extractor_classes, get_info_extractor
+
+    if ie_key:
+        ie = get_info_extractor(ie_key)
+    else:
+        # The first suitable extractor is the one yt-dlp itself would use
+        ie = next((ie for ie in gen_extractor_classes() if ie.suitable(url)), None)
+    if ie is None or not ie.is_single_video(url):
+        return None
+    return ie.get_temp_id(url)
+
+
+def expand_urls(urls, status_callback=None):
+    """Videos behind a list of video, playlist and channel URLs, each listed once
+
+    Returns ([(video URL, video id)], [(url, error message)]); a URL that
+    cannot be listed does not stop the others.
+    """
+    videos = {}
+    errors = []
+    for url in urls:
+        skipped = []
+        try:
+            found = expand_url(url, on_skip=skipped.append)
+        except Exception as e:
+            errors.append((url, str(e)))
+            continue
+        if status_callback and len(found) != 1:
+            status_callback(f"{url}: {len(found)} videos")
+        if status_callback and skipped:
+            status_callback(f"{url}: skipped {len(skipped)} entries without a video id: {', '.join(skipped)}")
+        for video_url, video_id in found:
+            videos.setdefault(video_id, video_url)
+    return [(video_url, video_id) for video_id, video_url in videos.items()], errors
+
+
+class FinishedArchive:
+    """IDs of videos already dubbed, one line per video and output, like yt-dlp's download archive
+
+    The same video dubbed into other languages or another container is a
+    different output, so lines are "<id> <languages> <format>". Only the
+    process scheduling the jobs writes to it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = set()
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = {line.strip() for line in f if line.strip()}
+
+    @staticmethod
+    def entry(video_id, job):
+        return f"{video_id} {'-'.join(job.languages)} {job.output_format}"
+
+    def __contains__(self, item):
+        video_id, job = item
+        return self.entry(video_id, job) in self.entries
+
+    def add(self, video_id, job):
+        entry = self.entry(video_id, job)
+        if entry in self.entries:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One short appended line per video, so a crash loses at most that line
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(entry + "\n")
+        self.entries.add(entry)
+
+
+class StageLimits:
+    """How many jobs may download, run other network-bound stages and run CPU-bound stages at once
+
+    Downloads and the other network stages (metadata, translation) wait on
+    remote services, CPU stages (decoding, mixing and encoding) on the
+    processor, so with separate limits one job's download overlaps another's
+    encode instead of every worker doing the same kind of work at once.
+    Downloads run in the background while the same job translates, so they
+    have limits of their own. The semaphores work across processes; hand the
+    object to workers when they start.
+    """
+
+    def __init__(self, network=4, cpu=None, download=None, context=None):
+        context = context or multiprocessing.get_context()
+        self.download = context.BoundedSemaphore(download or network)
+        self.network = context.BoundedSemaphore(network)
+        self.cpu = context.BoundedSemaphore(cpu or os.cpu_count() or 1)
+
+    def acquire(self, kind):
+        getattr(self, kind).acquire()
+
+    def release(self, kind):
+        getattr(self, kind).release()
@@ -0,0 +1,210 @@
+"""Offline pipeline benchmark: synthetic subtitles, stub translate/TTS backends and local media
+
+    python -m dubber.benchmark --sizes 100 1000 10000
+    python -m dubber.benchmark --save baseline.json
+    python -m dubber.benchmark --baseline baseline.json   # exits 1 on regression
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import srt
+
+from .pipeline import DubbingJob, DubbingPipeline
+from .translation import StubTranslator
+from .tts import StubTTS
+
+# Spans shown in the report, in pipeline order
+REPORTED_SPANS = ['subtitles', 'translation', 'synthesis', 'tts_request', 'decode',
+                  'mix_place', 'mix_flush', 'mix_write', 'download_wait', 'encode', 'mux', 'total']
+
+WORDS = ("the quick brown fox jumps over a lazy dog while seven wizards quietly "
+         "judge boxing matches near the old river bank every sunny morning").split()
+
+
+def generate_srt(path, count, repeat=0.0, cue_seconds=1.5, gap_seconds=0.5, seed=0):
+    """Write an SRT with count cues; a repeat fraction of them reuse an earlier line"""
+    rng = random.Random(seed)
+    lines = []
+    subtitles = []
+    for i in range(count):
+        if lines and rng.random() < repeat:
+            text = rng.choice(lines)
+        else:
+            text = f"{i} " + " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+            if rng.random() < 0.5:
+                text += "."
+            lines.append(text)
+        start = i * (cue_seconds + gap_seconds)
+        subtitles.append(srt.Subtitle(i + 1, timedelta(seconds=start),
+                                      timedelta(seconds=start + cue_seconds), text))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(srt.compose(subtitles))
+    return count * (cue_seconds + gap_seconds)
+
+
+def generate_media(path, duration):
+    """Write a tiny black video of the given length to stand in for the download"""
+    subprocess.run([
+        'ffmpeg', '-y', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'color=c=black:s=64x36:r=1:d={duration}',
+        '-c:v', 'mpeg4', path
+    ], check=True)
+
+
+class OfflinePipeline(DubbingPipeline):
+    """Pipeline that reads its media from a local file instead of YouTube"""
+
+    def __init__(self, media_path, duration, **kwargs):
+        super().__init__(**kwargs)
+        self.media_path = media_path
+        self.duration = duration
+
+    def video_info(self):
+        return {'id': os.path.basename(self.media_path), 'title': 'benchmark',
+                'duration': self.duration}
+
+    def fetch_metadata(self, url, output_path, subtitle_lang=None):
+        return {'subtitle_path': None, 'video_info': self.video_info()}
+
+    def download_media(self, url, output_path, info=None, section=None):
+        return {'video_path': self.media_path, 'audio_path': self.media_path,
+                'video_info': self.video_info()}
+
+
+def run_case(count, workdir, options):
+    """Dub one synthetic input and return its measurements; runs in a fresh process"""
+    case_dir = os.path.join(workdir, str(count))
+    os.makedirs(case_dir, exist_ok=True)
+    subtitle_path = os.path.join(case_dir, "subtitles.srt")
+    media_path = os.path.join(case_dir, "media.mp4")
+    duration = generate_srt(subtitle_path, count, repeat=options['repeat'])
+    generate_media(media_path, duration)
+
+    pipeline = OfflinePipeline(
+        media_path, duration,
+        tts_workers=options['tts_workers'],
+        translator_factory=lambda source, target: StubTranslator(
+            source, target, latency=options['translate_latency']),
+        tts_backend=StubTTS(latency=options['tts_latency']),
+        use_cache=False,
+        resume=False,
+        write_metrics=False,
+        stream_mux=options['stream_mux'],
+    )
+    job = DubbingJob(f"bench://{count}", case_dir, subtitle_path=subtitle_path)
+
+    start = time.perf_counter()
+    pipeline.run(job)
+    wall = time.perf_counter() - start
+
+    metrics = pipeline.metrics.to_dict()
+    return {
+        'cues': count,
+        'segments': metrics['counters'].get('cues_normalized', count),
+        'wall_seconds': wall,
+        'cues_per_second': count / wall,
+        'peak_rss_mb': (metrics['peak_rss_bytes'] or 0) / 1024 ** 2,
+        'stages': {name: span['seconds'] for name, span in metrics['spans'].items()},
+    }
+
+
+def find_regressions(results, baseline, tolerance):
+    """Messages for sizes that got slower or bigger than baseline by more than tolerance"""
+    previous = {case['cues']: case for case in baseline}
+    messages = []
+    for case in results:
+        old = previous.get(case['cues'])
+        if not old:
+            continue
+        if case['cues_per_second'] < old['cues_per_second'] * (1 - tolerance):
+            messages.append(f"{case['cues']} cues: {case['cues_per_second']:.1f} cues/s, "
+                            f"baseline {old['cues_per_second']:.1f}")
+        if old['peak_rss_mb'] and case['peak_rss_mb'] > old['peak_rss_mb'] * (1 + tolerance):
+            messages.append(f"{case['cues']} cues: peak RSS {case['peak_rss_mb']:.0f} MB, "
+                            f"baseline {old['peak_rss_mb']:.0f} MB")
+    return messages
+
+
+def print_report(results):
+    print(f"{'cues':>7} {'segments':>9} {'wall s':>9} {'cues/s':>9} {'peak MB':>8}")
+    for case in results:
+        print(f"{case['cues']:>7} {case['segments']:>9} {case['wall_seconds']:>9.2f} "
+              f"{case['cues_per_second']:>9.1f} {case['peak_rss_mb']:>8.0f}")
+    print()
+    print(f"{'stage (s)':<14}" + "".join(f"{case['cues']:>10}" for case in results))
+    for name in REPORTED_SPANS:
+        if any(name in case['stages'] for case in results):
+            print(f"{name:<14}" + "".join(f"{case['stages'].get(name, 0):>10.2f}" for case in results))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m dubber.benchmark",
+        description="Measure pipeline throughput offline with stub backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000],
+                        help="cue counts to benchmark (default: 100 1000 10000)")
+    parser.add_argument("--repeat", type=float, default=0.3,
+                        help="fraction of cues that repeat an earlier line (default: 0.3)")
+    parser.add_argument("--translate-latency", type=float, default=0.0,
+                        help="seconds the stub translator sleeps per request")
+    parser.add_argument("--tts-latency", type=float, default=0.0,
+                        help="seconds the stub TTS sleeps per segment")
+    parser.add_argument("--tts-workers", type=int, default=4)
+    parser.add_argument("--no-stream-mux", action="store_true",
+                        help="benchmark the temporary WAV file path")
+    parser.add_argument("--workdir", default=None,
+                        help="keep inputs and outputs here instead of a temporary directory")
+    parser.add_argument("--save", default=None, help="write the results as JSON")
+    parser.add_argument("--baseline", default=None,
+                        help="results JSON to compare against; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown or memory growth against the baseline (default: 0.2)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    options = {
+        'repeat': args.repeat,
+        'translate_latency': args.translate_latency,
+        'tts_latency': args.tts_latency,
+        'tts_workers': args.tts_workers,
+        'stream_mux': not args.no_stream_mux,
+    }
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        workdir = args.workdir or temp_dir
+        results = []
+        for count in args.sizes:
+            # A fresh process per size, so peak RSS belongs to that size alone
+            with ProcessPoolExecutor(max_workers=1,
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                results.append(pool.submit(run_case, count, workdir, options).result())
+
+    print_report(results)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        for message in regressions:
+            print(f"Regression: {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .batch import FinishedArchive, StageLimits, expand_urls
+from .events import EventBus, Throttle
+from .info_cache import shared_info_cache
+from .job_queue import JobQueue, enqueue_job
+from .metrics import PrometheusFile
+from .pipeline import DubbingJob, DubbingPipeline
+from .ratelimit import shared_client
+from .subtitles import parse_timestamp
+from .voice_clone import DEFAULT_MODEL, VoiceCloneBackend, VoiceCloneWorker
+
+
+# One per path and process, so totals accumulate across the jobs a worker runs
+_prometheus_files = {}
+# One warm model per process, reused by every job it runs
+_voice_workers = {}
+# Network and CPU slots shared by all worker processes; set when a worker starts
+_stage_limits = None
+
+
+def init_worker(stage_limits):
+    global _stage_limits
+    _stage_limits = stage_limits
+
+
+def prometheus_file(path, per_process=False):
+    if per_process:
+        # Worker processes must not overwrite each other's totals
+        base, ext = os.path.splitext(path)
+        path = f"{base}.{os.getpid()}{ext}"
+    if path not in _prometheus_files:
+        _prometheus_files[path] = PrometheusFile(path)
+    return _prometheus_files[path]
+
+
+def voice_clone_backend(model_name, speaker_wav):
+    if model_name not in _voice_workers:
+        _voice_workers[model_name] = VoiceCloneWorker(model_name)
+    return VoiceCloneBackend(_voice_workers[model_name], speaker_wav)
+
+
+def close_voice_workers():
+    for worker in _voice_workers.values():
+        worker.close()
+
+
+def run_job(job_data, pipeline_options=None, json_events=False, prometheus_path=None,
+            per_process=False, voice_clone=None, rate_limits=None, stage=None, cancel_check=None):
+    """Run one job, or only one stage of it; module level so it can be sent to worker processes"""
+    job = DubbingJob.from_dict(job_data)
+    # Creates the process's shared clients with these ceilings before any backend does
+    for name, rate in (rate_limits or {}).items():
+        shared_client(name, rate=rate)
+    progress = 0
+
+    def print_event(event):
+        nonlocal progress
+        if json_events:
+            print(json.dumps(dict(event, url=job.url), ensure_ascii=False), flush=True)
+        elif event['type'] == 'progress':
+            progress = event['value']
+        elif event['type'] == 'status':
+            print(f"[{job.url}] {int(progress)}% {event['message']}", flush=True)
+
+    events = EventBus()
+    throttle = events.subscribe(Throttle(print_event))
+    prometheus = prometheus_file(prometheus_path, per_process) if prometheus_path else None
+    tts_backend = voice_clone_backend(*voice_clone) if voice_clone else None
+    pipeline = DubbingPipeline(events=events, prometheus=prometheus, tts_backend=tts_backend,
+                               stage_limits=_stage_limits, info_cache=shared_info_cache(),
+                               cancel_check=cancel_check, **(pipeline_options or {}))
+    try:
+        return pipeline.run_stage(job, stage) if stage else pipeline.run(job)
+    finally:
+        throttle.flush()
+
+
+def preview_range(value):
+    """START-END in seconds or m:ss, for --preview"""
+    try:
+        start, end = (parse_timestamp(part) for part in value.split('-'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected START-END, e.g. 90-120 or 1:30-2:00")
+    if end <= start:
+        raise argparse.ArgumentTypeError("the preview must end after it starts")
+    return [start, end]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m dubber",
+        description="Download, translate and dub YouTube videos without the GUI")
+    parser.add_argument("urls", nargs="+",
+                        help="one or more video, playlist or channel URLs; playlists and "
+                             "channels become one job per video")
+    parser.add_argument("-o", "--output", required=True, help="output directory")
+    parser.add_argument("-t", "--target-lang", default="ar",
+                        help="dubbing language, or several separated by commas for one "
+                             "audio track each (default: ar)")
+    parser.add_argument("-s", "--source-lang", default=None,
+                        help="subtitle/source language (default: auto)")
+    parser.add_argument("--subtitles", default=None,
+                        help="SRT file to use instead of the downloaded subtitles")
+    parser.add_argument("--format", choices=["mp4", "mkv"], default="mp4",
+                        help="output container (default: mp4)")
+    parser.add_argument("--preview", type=preview_range, default=None, metavar="START-END",
+                        help="dub only this part of the video into a short clip, "
+                             "e.g. 1:30-2:00, to check the voice and translation")
+    parser.add_argument("--no-normalize", action="store_true",
+                        help="use subtitle cues as they are instead of merging them into sentences")
+    parser.add_argument("--max-cue-seconds", type=float, default=8.0,
+                        help="longest cue after merging; longer ones are split (default: 8)")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="number of videos to process in parallel worker processes")
+    parser.add_argument("--download-jobs", type=int, default=None,
+                        help="with --jobs, most videos downloading at once (default: --jobs)")
+    parser.add_argument("--network-jobs", type=int, default=None,
+                        help="with --jobs, most videos loading metadata or translating at once "
+                             "(default: --jobs)")
+    parser.add_argument("--cpu-jobs", type=int, default=None,
+                        help="with --jobs, most videos decoding, mixing or encoding at once "
+                             "(default: number of CPUs)")
+    parser.add_argument("--archive", default=None, metavar="FILE",
+                        help="skip videos listed in FILE and add each finished video to it, "
+                             "so a playlist or channel can be run again for its new videos")
+    parser.add_argument("--queue", default=None, metavar="FILE",
+                        help="add the jobs to this queue file for python -m dubber.worker "
+                             "instead of running them")
+    parser.add_argument("--split-stages", action="store_true",
+                        help="with --queue, also queue each video's download and translation "
+                             "as separate tasks that workers can take ahead of the dubbing")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="with --queue, attempts before a task is dead-lettered (default: 3)")
+    parser.add_argument("--tts-workers", type=int, default=4,
+                        help="concurrent speech synthesis requests per video (default: 4)")
+    parser.add_argument("--tts-rate", type=float, default=None,
+                        help="most gTTS requests per second per worker process; lowered "
+                             "automatically while the service throttles (default: 10)")
+    parser.add_argument("--translate-rate", type=float, default=None,
+                        help="most translation requests per second per worker process (default: 5)")
+    parser.add_argument("--voice-clone", default=None, metavar="SPEAKER_WAV",
+                        help="speak in the voice of this recording with a local voice-cloning model")
+    parser.add_argument("--voice-model", default=None,
+                        help="Coqui TTS model for --voice-clone (default: XTTS v2)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory for persistent caches (default: ~/.cache/dubber)")
+    parser.add_argument("--no-cache", action="store_true", help="disable persistent caches")
+    parser.add_argument("--audio-cache-mb", type=int, default=2048,
+                        help="size limit of the synthesized speech cache in MB (default: 2048)")
+    parser.add_argument("--media-store-gb", type=float, default=20,
+                        help="size limit of the downloaded media store in GB (default: 20)")
+    parser.add_argument("--fragments", type=int, default=4,
+                        help="fragments yt-dlp downloads concurrently (default: 4)")
+    parser.add_argument("--scratch-dir", default=None,
+                        help="root for per-job scratch workspaces holding downloads and "
+                             "intermediate audio, e.g. /dev/shm "
+                             "(default: DUBBER_SCRATCH_DIR or the system temp directory)")
+    parser.add_argument("--no-stream-mux", action="store_true",
+                        help="write the mixed track to a temporary WAV file before muxing")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep the mixed tracks, so a later run after editing the subtitles "
+                             "re-dubs only the changed cues and replaces the audio")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="do not read or write job checkpoints")
+    parser.add_argument("--no-metrics", action="store_true",
+                        help="do not write <output>.metrics.json with per-stage timings")
+    parser.add_argument("--prometheus-file", default=None,
+                        help="keep running totals in this Prometheus text file "
+                             "(one file per worker process with --jobs)")
+    parser.add_argument("--json-events", action="store_true",
+                        help="print progress as one JSON event per line instead of status lines")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if min(args.jobs, args.download_jobs or 1, args.network_jobs or 1, args.cpu_jobs or 1) < 1:
+        print("--jobs, --download-jobs, --network-jobs and --cpu-jobs must be at least 1")
+        return 2
+    if args.split_stages and (args.no_cache or args.no_resume):
+        # A download task keeps the video for the dubbing task in the media store,
+        # and the stage tasks hand their results on through the job's checkpoints
+        print("--split-stages needs the caches and checkpoints; drop --no-cache and --no-resume")
+        return 2
+
+    def report(message):
+        # JSON output already carries done and error events
+        if not args.json_events:
+            print(message)
+
+    failures = 0
+    videos, errors = expand_urls(args.urls, report)
+    for url, error in errors:
+        failures += 1
+        report(f"Error: {url}: {error}")
+
+    target_langs = [lang.strip() for lang in args.target_lang.split(",") if lang.strip()]
+    archive = FinishedArchive(args.archive) if args.archive else None
+    jobs = []
+    for url, video_id in videos:
+        job = DubbingJob(url, args.output,
+                         target_langs=target_langs,
+                         source_lang=args.source_lang,
+                         subtitle_path=args.subtitles,
+                         output_format=args.format,
+                         preview=args.preview)
+        # A preview is not the finished video, so it neither skips nor is archived
+        if archive is not None and not job.preview and (video_id, job) in archive:
+            continue
+        jobs.append((video_id, job))
+    if len(jobs) < len(videos):
+        report(f"Skipping {len(videos) - len(jobs)} videos already in {args.archive}")
+
+    def finished(video_id, job, output):
+        report(f"Done: {output}")
+        if archive is not None and not job.preview:
+            archive.add(video_id, job)
+
+    pipeline_options = {
+        'tts_workers': args.tts_workers,
+        'use_cache': not args.no_cache,
+        'cache_dir': args.cache_dir,
+        'audio_cache_bytes': args.audio_cache_mb * 1024 * 1024,
+        'stream_mux': not args.no_stream_mux,
+        'resume': not args.no_resume,
+        'media_store_bytes': int(args.media_store_gb * 1024 ** 3),
+        'fragment_downloads': args.fragments,
+        'scratch_dir': args.scratch_dir,
+        'incremental': args.incremental,
+        'write_metrics': not args.no_metrics,
+        'normalize': not args.no_normalize,
+        'max_cue_seconds': args.max_cue_seconds,
+    }
+
+    voice_clone = None
+    if args.voice_clone:
+        voice_clone = (args.voice_model or DEFAULT_MODEL, args.voice_clone)
+
+    rate_limits = {name: rate for name, rate in [('gtts', args.tts_rate),
+                                                  ('google_translate', args.translate_rate)]
+                   if rate}
+
+    if args.queue:
+        queue = JobQueue(args.queue)
+        payload = {'options': pipeline_options, 'voice_clone': voice_clone, 'rate_limits': rate_limits}
+        for _, job in jobs:
+            enqueue_job(queue, job, payload, args.split_stages, args.max_attempts)
+        report(f"Queued {len(jobs)} jobs in {args.queue}")
+        return 1 if failures else 0
+
+    if args.jobs == 1 or len(jobs) <= 1:
+        for video_id, job in jobs:
+            try:
+                output = run_job(job.to_dict(), pipeline_options, args.json_events, args.prometheus_file,
+                                 voice_clone=voice_clone, rate_limits=rate_limits)
+                finished(video_id, job, output)
+            except Exception as e:
+                failures += 1
+                report(f"Error: {job.url}: {e}")
+    else:
+        # More workers than CPU slots lets downloads and translations of some
+        # videos run while others encode
+        stage_limits = StageLimits(args.network_jobs or args.jobs, args.cpu_jobs,
+                                   args.download_jobs or args.jobs)
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker,
+                                 initargs=(stage_limits,)) as pool:
+            futures = {pool.submit(run_job, job.to_dict(), pipeline_options, args.json_events,
+                                   args.prometheus_file, True, voice_clone, rate_limits): (video_id, job)
+                       for video_id, job in jobs}
+            for future in as_completed(futures):
+                video_id, job = futures[future]
+                try:
+                    finished(video_id, job, future.result())
+                except Exception as e:
+                    failures += 1
+                    report(f"Error: {job.url}: {e}")
+
+    close_voice_workers()
+    return 1 if failures else 0
@@ -0,0 +1,108 @@
+import threading
+import time
+
+# Only the latest of these matters, so consumers may drop the ones in between
+COALESCED_EVENTS = ('status', 'progress')
+
+
+class EventBus:
+    """Delivers pipeline events to subscribers; safe to publish from any thread
+
+    An event is a plain dict with a 'type', a 'time' and type specific
+    fields: status (message), progress (value), error (message) and done
+    (output). Subscribers are called on the publishing thread, so anything
+    that must run on a particular thread, like a Tk widget, should subscribe
+    through an EventQueue.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers = self._subscribers + [callback]
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not callback]
+
+    def publish(self, event_type, **fields):
+        event = dict(fields, type=event_type, time=time.time())
+        for callback in self._subscribers:
+            callback(event)
+
+
+class EventQueue:
+    """Subscriber that buffers events until a consumer drains them
+
+    A newer status or progress event replaces the buffered one, so a
+    consumer draining every 100 ms sees at most one of each per drain no
+    matter how fast the pipeline publishes.
+    """
+
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event['type'] in COALESCED_EVENTS:
+                self._events = [e for e in self._events if e['type'] != event['type']]
+            self._events.append(event)
+
+    def drain(self):
+        """Buffered events in publishing order"""
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+
+class Throttle:
+    """Subscriber that forwards events to callback, status and progress at most every min_interval
+
+    Held updates are coalesced and sent once the interval has passed, or
+    before the next event of another type, so the last one is never lost.
+    The callback is called from the publishing threads and a timer thread,
+    one call at a time.
+    """
+
+    def __init__(self, callback, min_interval=0.5):
+        self.callback = callback
+        self.min_interval = min_interval
+        self._pending = {}
+        self._last_sent = {}
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock:
+            if event['type'] not in COALESCED_EVENTS:
+                self._send_pending()
+                self.callback(event)
+                return
+
+            self._pending[event['type']] = event
+            wait = self._last_sent.get(event['type'], 0) + self.min_interval - time.monotonic()
+            if wait <= 0:
+                self._send_pending()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _send_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending = sorted(self._pending.values(), key=lambda e: e['time'])
+        self._pending = {}
+        for event in pending:
+            self._last_sent[event['type']] = time.monotonic()
+            self.callback(event)
+
+    def flush(self):
+        """Send any held updates now"""
+        with self._lock:
+            self._send_pending()
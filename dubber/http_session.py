@@ -0,0 +1,22 @@
+import threading
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def shared_session(pool_size=8):
+    """Process-wide requests.Session, so repeated requests to a host reuse its connections
+
+    pool_size only applies to the call that creates the session.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import os
+
+from .audio_io import SAMPLE_RATE
+from .paths import write_atomic
+
+
+def placement_key(start, slot_end, translation):
+    """Cues with equal keys produce identical audio in identical places"""
+    return (round(start, 3), round(slot_end, 3), translation)
+
+
+def diff_placements(old_cues, new_keys):
+    """Match new cues to identical old ones
+
+    Returns ({new index: old extent}, extents of old cues that are gone,
+    indices of new cues that have no old counterpart).
+    """
+    available = {}
+    for start, slot_end, _, translation, offset, end in old_cues:
+        available.setdefault(placement_key(start, slot_end, translation), []).append((offset, end))
+
+    matched = {}
+    added = []
+    for index, key in enumerate(new_keys):
+        extents = available.get(key)
+        if extents:
+            matched[index] = extents.pop(0)
+        else:
+            added.append(index)
+    removed = [extent for extents in available.values() for extent in extents]
+    return matched, removed, added
+
+
+def merge_intervals(intervals):
+    """Sorted, non-overlapping, non-empty (start, end) sample ranges covering intervals"""
+    merged = []
+    for start, end in sorted(interval for interval in intervals if interval[1] > interval[0]):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def overlaps(extent, regions):
+    return any(extent[0] < end and start < extent[1] for start, end in regions)
+
+
+class TrackPatch:
+    """Re-mixes only the regions of a recorded track where cues changed
+
+    Each region starts silent and every cue that reaches into it is placed
+    again, clipped to the region, so audio outside the regions stays exactly
+    as recorded. The recorded track is streamed through block by block, so
+    memory depends on the size of the regions, not on the length of the video.
+    """
+
+    def __init__(self, fitter, regions):
+        import numpy as np
+
+        # A mixer, used only for how it fits audio into a cue's slot
+        self.fitter = fitter
+        self.regions = [(start, end, np.zeros(end - start, dtype=np.float32)) for start, end in regions]
+
+    def add(self, offset, data):
+        """Mix in audio that was already fitted at offset"""
+        for start, end, buffer in self.regions:
+            low = max(start, offset)
+            high = min(end, offset + len(data))
+            if low < high:
+                buffer[low - start:high - start] += data[low - offset:high - offset]
+
+    def place(self, data, start, slot_end):
+        offset, data = self.fitter.fit(data, start, slot_end)
+        self.add(offset, data)
+        return offset, offset + len(data)
+
+    def write(self, source_path, target_path, length, block_size=441000):
+        """Copy the track at source_path to target_path as length samples, with the regions replaced"""
+        import numpy as np
+        import soundfile as sf
+
+        with sf.SoundFile(source_path) as source, \
+                sf.SoundFile(target_path, 'w', source.samplerate, 1, subtype='PCM_16', format='FLAC') as target:
+            position = 0
+            while position < length:
+                count = min(block_size, length - position)
+                block = source.read(count, dtype='float32')
+                if len(block) < count:
+                    # The new cues run past the end of the recorded track
+                    block = np.concatenate([block, np.zeros(count - len(block), dtype=np.float32)])
+                for start, end, buffer in self.regions:
+                    low = max(start, position)
+                    high = min(end, position + count)
+                    if low < high:
+                        block[low - position:high - position] = np.clip(
+                            buffer[low - start:high - start], -1.0, 1.0)
+                target.write(block)
+                position += count
+
+
+class RenderRecord:
+    """What the last successful run of a job produced, kept for incremental re-dubs
+
+    For each language it stores the mixed track as FLAC and, per cue, the
+    source text, the translation and the samples its audio covers. Unlike
+    the JobManifest it is keyed without the subtitles, so a run with edited
+    subtitles finds the record of the run before the edit.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "render.json")
+        os.makedirs(directory, exist_ok=True)
+        self.data = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except ValueError:
+                pass  # unreadable record: the next run renders everything
+
+    @staticmethod
+    def render_key(job):
+        payload = json.dumps([job.url, job.source_lang, job.languages, job.output_format])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def for_job(cls, job, root=None):
+        root = root or os.path.join(job.output_dir, ".dubber", "renders")
+        return cls(os.path.join(root, cls.render_key(job)))
+
+    def track_path(self, lang):
+        return os.path.join(self.directory, f"{lang}.flac")
+
+    def partial_track_path(self, lang):
+        return os.path.join(self.directory, f"{lang}.part.flac")
+
+    def usable(self, video_id, output_video, tts_backend, languages):
+        """Whether the record describes output_video as rendered for this video and voice"""
+        data = self.data
+        return bool(
+            data
+            and data['video_id'] == video_id
+            and data['tts'] == [tts_backend.name, tts_backend.voice]
+            and data['sample_rate'] == SAMPLE_RATE
+            and os.path.exists(output_video)
+            and all(lang in data['tracks'] and os.path.exists(self.track_path(lang)) for lang in languages))
+
+    def cues(self, lang):
+        """[start, slot_end, text, translation, offset, end] per cue of the recorded run"""
+        return self.data['tracks'][lang]
+
+    def translations(self, lang):
+        return {text: translation for _, _, text, translation, _, _ in self.cues(lang)}
+
+    def discard_partial_tracks(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(".part.flac"):
+                os.remove(os.path.join(self.directory, name))
+
+    def save(self, video_id, tts_backend, tracks):
+        """Commit the partial tracks written for this run and record its cues
+
+        tracks maps each language to its cue list. The old record is removed
+        first, so a crash half way leaves no record rather than one that
+        does not match its tracks.
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.data = None
+        for lang in tracks:
+            if os.path.exists(self.partial_track_path(lang)):
+                os.replace(self.partial_track_path(lang), self.track_path(lang))
+        data = {
+            'video_id': video_id,
+            'tts': [tts_backend.name, tts_backend.voice],
+            'sample_rate': SAMPLE_RATE,
+            'tracks': tracks,
+        }
+        write_atomic(self.path, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        self.data = data
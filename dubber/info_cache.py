@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+
+# yt-dlp's format URLs are signed and expire after a few hours, and a cached
+# info dict is also used to download the media, so entries live much shorter
+DEFAULT_TTL = 30 * 60
+
+
+class VideoInfoCache:
+    """Recently extracted yt-dlp info dicts, found by URL or by video ID
+
+    Loading a video's info in the UI and then dubbing it extracts it once
+    instead of twice, and clicking "Load Video Info" again is instant.
+    Entries expire after ttl seconds; past max_entries the least recently
+    used one is dropped. Safe to use from several threads.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_entries=64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # video id -> (stored at, info)
+        self._ids = {}  # URL -> video id
+        self._lock = threading.Lock()
+
+    def get(self, url_or_id):
+        """The info dict for a URL or video ID, or None if absent or expired"""
+        now = time.monotonic()
+        with self._lock:
+            video_id = self._ids.get(url_or_id, url_or_id)
+            entry = self._entries.get(video_id)
+            if entry is None or now - entry[0] > self.ttl:
+                self._entries.pop(video_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(video_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, url, info):
+        """Store a single video's info under its ID and every URL it is known by"""
+        video_id = info.get('id')
+        if not video_id or info.get('_type', 'video') != 'video':
+            return
+        with self._lock:
+            self._entries[video_id] = (time.monotonic(), info)
+            self._entries.move_to_end(video_id)
+            for key in {url, info.get('webpage_url'), info.get('original_url')}:
+                if key:
+                    self._ids[key] = video_id
+            while len(self._entries) > self.max_entries:
+                dropped, _ = self._entries.popitem(last=False)
+                self._ids = {key: value for key, value in self._ids.items() if value != dropped}
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_info_cache():
+    """The process-wide cache, shared by the UI, batch expansion and every pipeline"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = VideoInfoCache()
+        return _shared
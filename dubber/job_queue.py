@@ -0,0 +1,244 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from .manifest import JobManifest
+
+# What a worker can be asked to do: one stage of a job, or the whole job
+TASK_KINDS = ['download', 'translation', 'dub']
+
+
+class Task:
+    """One leased unit of work: a whole dubbing job or one of its stages"""
+
+    def __init__(self, task_id, kind, payload, attempts, max_attempts, lease_expires):
+        self.id = task_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        self.max_attempts = max_attempts
+        self.lease_expires = lease_expires
+
+
+class JobQueue:
+    """Durable task queue in one SQLite file, shared by any number of worker processes
+
+    A worker leases a task for lease_seconds and must renew the lease with
+    heartbeat() while it works. A task whose lease runs out, because its
+    worker crashed or hung, is handed to the next worker. Failed tasks are
+    retried with exponential backoff until max_attempts, then kept as dead
+    letters until retried by hand. A task can wait for others to finish
+    first; it runs once they are done or dead.
+
+    Like the TranslationCache every call opens its own connection and
+    writers take the lock up front. WAL mode does not work on network
+    filesystems, so a queue shared by several hosts is created with
+    journal_mode "DELETE" on a filesystem with working locks.
+    """
+
+    STATES = ['queued', 'leased', 'done', 'dead']
+
+    def __init__(self, path, journal_mode="WAL", retry_delay=30.0):
+        self.path = path
+        self.retry_delay = retry_delay
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new = not os.path.exists(path)
+
+        with self._connect() as conn:
+            if new:
+                # Stored in the file; whoever creates the queue chooses it
+                conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    id INTEGER PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    key TEXT UNIQUE,
+                    payload TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'queued',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS dependencies (
+                    task_id INTEGER NOT NULL,
+                    depends_on INTEGER NOT NULL,
+                    PRIMARY KEY (task_id, depends_on)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (state, available_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, kind, payload, key=None, max_attempts=3, depends_on=()):
+        """Add a task and return its id
+
+        A task with the same key that is not dead is not added again; its id
+        is returned instead, so enqueueing a playlist twice queues each video
+        once. A dead task with the key is queued again under the same id, so
+        tasks that depend on it keep waiting for it.
+        """
+        now = time.time()
+        payload = json.dumps(payload, ensure_ascii=False)
+        with self._transaction() as conn:
+            row = None
+            if key is not None:
+                row = conn.execute("SELECT id, state FROM tasks WHERE key = ?", (key,)).fetchone()
+                if row and row[1] != 'dead':
+                    return row[0]
+            if row:
+                task_id = row[0]
+                conn.execute(
+                    "UPDATE tasks SET kind = ?, payload = ?, state = 'queued', attempts = 0, max_attempts = ?, "
+                    "available_at = ?, lease_owner = NULL, lease_expires = NULL, result = NULL, error = NULL, "
+                    "updated = ? WHERE id = ?", (kind, payload, max_attempts, now, now, task_id))
+                conn.execute("DELETE FROM dependencies WHERE task_id = ?", (task_id,))
+            else:
+                task_id = conn.execute(
+                    "INSERT INTO tasks (kind, key, payload, max_attempts, available_at, created, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (kind, key, payload, max_attempts, now, now, now)).lastrowid
+            conn.executemany("INSERT OR IGNORE INTO dependencies (task_id, depends_on) VALUES (?, ?)",
+                             [(task_id, other) for other in depends_on])
+        return task_id
+
+    def _expire_leases(self, conn, now):
+        """Hand out again the tasks whose workers stopped renewing their lease"""
+        conn.execute(
+            "UPDATE tasks SET state = 'dead', error = 'lease expired', lease_owner = NULL, updated = ? "
+            "WHERE state = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now))
+        conn.execute(
+            "UPDATE tasks SET state = 'queued', lease_owner = NULL, updated = ? "
+            "WHERE state = 'leased' AND lease_expires < ?", (now, now))
+
+    def lease(self, worker_id, kinds=None, lease_seconds=60.0):
+        """Take the oldest task that is ready to run, or None"""
+        now = time.time()
+        kind_filter = ""
+        params = [now]
+        if kinds:
+            kind_filter = f"AND kind IN ({','.join('?' * len(kinds))})"
+            params += list(kinds)
+        with self._transaction() as conn:
+            self._expire_leases(conn, now)
+            row = conn.execute(
+                f"SELECT id, kind, payload, attempts, max_attempts FROM tasks "
+                f"WHERE state = 'queued' AND available_at <= ? {kind_filter} "
+                f"AND NOT EXISTS (SELECT 1 FROM dependencies d JOIN tasks t ON t.id = d.depends_on "
+                f"                WHERE d.task_id = tasks.id AND t.state IN ('queued', 'leased')) "
+                f"ORDER BY available_at, id LIMIT 1", params).fetchone()
+            if row is None:
+                return None
+            task_id, kind, payload, attempts, max_attempts = row
+            expires = now + lease_seconds
+            conn.execute(
+                "UPDATE tasks SET state = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ?, updated = ? WHERE id = ?", (worker_id, expires, now, task_id))
+        return Task(task_id, kind, json.loads(payload), attempts + 1, max_attempts, expires)
+
+    def heartbeat(self, task, worker_id, lease_seconds=60.0):
+        """Extend the lease; False if the worker no longer holds it"""
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (now + lease_seconds, now, task.id, worker_id)).rowcount
+        if updated:
+            task.lease_expires = now + lease_seconds
+        return bool(updated)
+
+    def complete(self, task, worker_id, result=None):
+        """Mark a leased task done; False if its lease had already been lost"""
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET state = 'done', result = ?, error = NULL, lease_owner = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                (json.dumps(result, ensure_ascii=False), now, task.id, worker_id)).rowcount
+        return bool(updated)
+
+    def fail(self, task, worker_id, error, retry=True):
+        """Queue a failed task again after a backoff, or dead-letter it
+
+        It is dead-lettered once it has used max_attempts, or at once when
+        retry is False because the error will not go away by itself.
+        """
+        now = time.time()
+        dead = not retry or task.attempts >= task.max_attempts
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE tasks SET state = ?, error = ?, available_at = ?, lease_owner = NULL, updated = ? "
+                "WHERE id = ? AND state = 'leased' AND lease_owner = ?",
+                ('dead' if dead else 'queued', error,
+                 now + self.retry_delay * 2 ** (task.attempts - 1), now, task.id, worker_id)).rowcount
+        return bool(updated)
+
+    def retry_dead(self, task_id=None):
+        """Queue dead tasks again with fresh attempts; all of them without task_id"""
+        now = time.time()
+        with self._transaction() as conn:
+            query = ("UPDATE tasks SET state = 'queued', attempts = 0, available_at = ?, updated = ? "
+                     "WHERE state = 'dead'")
+            if task_id is None:
+                return conn.execute(query, (now, now)).rowcount
+            return conn.execute(query + " AND id = ?", (now, now, task_id)).rowcount
+
+    def counts(self):
+        """Number of tasks in each state"""
+        with self._connect() as conn:
+            self._expire_leases(conn, time.time())
+            rows = conn.execute("SELECT state, COUNT(*) FROM tasks GROUP BY state").fetchall()
+        return dict(dict.fromkeys(self.STATES, 0), **dict(rows))
+
+    def dead_letters(self):
+        """(id, kind, key, attempts, error) of every dead task"""
+        with self._connect() as conn:
+            return conn.execute("SELECT id, kind, key, attempts, error FROM tasks "
+                                "WHERE state = 'dead' ORDER BY id").fetchall()
+
+
+def enqueue_job(queue, job, payload, split_stages=False, max_attempts=3):
+    """Queue a job as a 'dub' task, after 'download' and 'translation' tasks if split_stages
+
+    payload holds run_job's other arguments. The stage tasks run one after
+    the other, because each one rewrites the job's manifest. Returns the
+    id of the 'dub' task.
+    """
+    key = f"{job.output_dir}:{JobManifest.job_key(job)}:{job.output_format}"
+    payload = dict(payload, job=job.to_dict())
+    depends_on = []
+    if split_stages and not job.preview:
+        for kind in ['download', 'translation']:
+            depends_on = [queue.enqueue(kind, payload, f"{kind}:{key}", max_attempts, depends_on)]
+    return queue.enqueue('dub', payload, f"dub:{key}", max_attempts, depends_on)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from datetime import timedelta
+
+from .audio_io import AUDIO_SIGNATURES, audio_extension
+from .paths import write_atomic
+
+
+def cues_to_json(subtitle_info):
+    return [[start.total_seconds(), end.total_seconds(), text] for start, end, text in subtitle_info]
+
+
+def cues_from_json(data):
+    return [(timedelta(seconds=start), timedelta(seconds=end), text) for start, end, text in data]
+
+
+class JobManifest:
+    """Checkpoint of a job's completed stages, stored next to its output
+
+    Stage results live in manifest.json; synthesized segments are stored as
+    individual files, one directory per target language, so marking one done
+    never rewrites the manifest. The 'translation' stage maps each target
+    language to its translated lines.
+    """
+
+    # Each stage depends on the ones before it; the media download runs on
+    # its own and is checkpointed separately as 'download'
+    STAGES = ['metadata', 'subtitles', 'translation', 'synthesis']
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = os.path.join(directory, "manifest.json")
+        self.segment_dir = os.path.join(directory, "segments")
+        # The background download checkpoints from another thread
+        self._lock = threading.Lock()
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+        self.data = {'stages': {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except ValueError:
+                pass  # unreadable manifest: start the job over
+
+    @staticmethod
+    def job_key(job):
+        fields = [job.url, job.source_lang, job.languages, job.subtitle_text, job.subtitle_path]
+        if job.preview:
+            fields.append(job.preview)
+        payload = json.dumps(fields, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def for_job(cls, job, root=None):
+        root = root or os.path.join(job.output_dir, ".dubber")
+        return cls(os.path.join(root, cls.job_key(job)))
+
+    def stage(self, name):
+        """Saved result of a completed stage, or None"""
+        return self.data['stages'].get(name)
+
+    def complete_stage(self, name, result):
+        with self._lock:
+            self.data['stages'][name] = result
+            self.save()
+
+    def update_stage(self, name, key, value):
+        """Set one key of a dict-valued stage, such as one language's translation"""
+        with self._lock:
+            self.data['stages'].setdefault(name, {})[key] = value
+            self.save()
+
+    def reset_from(self, name):
+        """Forget name and every later stage, because they depend on it"""
+        with self._lock:
+            for stage in self.STAGES[self.STAGES.index(name):]:
+                self.data['stages'].pop(stage, None)
+            if 'synthesis' in self.STAGES[self.STAGES.index(name):]:
+                self.clear_segments()
+            self.save()
+
+    def save(self):
+        write_atomic(self.path, json.dumps(self.data, ensure_ascii=False).encode('utf-8'))
+
+    def segment_path(self, index, lang, ext="mp3"):
+        return os.path.join(self.segment_dir, lang, f"{index}.{ext}")
+
+    def load_segment(self, index, lang):
+        for ext in ['mp3'] + [ext for _, ext in AUDIO_SIGNATURES]:
+            try:
+                with open(self.segment_path(index, lang, ext), 'rb') as f:
+                    return f.read()
+            except FileNotFoundError:
+                pass
+        return None
+
+    def save_segment(self, index, data, lang):
+        """Keep a segment's encoded audio, named after its actual format"""
+        path = self.segment_path(index, lang, audio_extension(data))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, data)
+
+    def clear_segments(self, lang=None):
+        """Delete saved segments for one language, or for all of them"""
+        shutil.rmtree(os.path.join(self.segment_dir, lang) if lang else self.segment_dir,
+                      ignore_errors=True)
+        os.makedirs(self.segment_dir, exist_ok=True)
+
+    def discard(self):
+        """Delete the checkpoint once the job's output is final"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        try:
+            # The per-directory root, once no other job keeps checkpoints in it
+            os.rmdir(os.path.dirname(self.directory))
+        except OSError:
+            pass
+
+    def completed_segments(self, lang):
+        directory = os.path.join(self.segment_dir, lang)
+        if not os.path.isdir(directory):
+            return set()
+        return {int(name.split('.')[0]) for name in os.listdir(directory)
+                if not name.endswith('.tmp')}
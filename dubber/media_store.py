@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from .paths import write_atomic
+
+# Bytes hashed at each end of a file for its fingerprint
+_FINGERPRINT_CHUNK = 1024 * 1024
+
+
+def fingerprint(path):
+    """Cheap integrity check: size plus a hash of the first and last megabyte"""
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(_FINGERPRINT_CHUNK))
+        if size > _FINGERPRINT_CHUNK:
+            f.seek(max(_FINGERPRINT_CHUNK, size - _FINGERPRINT_CHUNK))
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def format_key(format_spec):
+    return hashlib.sha1(format_spec.encode('utf-8')).hexdigest()[:10]
+
+
+class MediaStore:
+    """Downloaded media kept per (video ID, format) so re-dubs skip the download
+
+    Each entry directory holds the files for one video and format: the
+    container ('video'), its audio track once asked for ('audio') and subtitle
+    files ('subtitles.<lang>'). Each file has a <kind>.json record of its
+    size and fingerprint; a file that fails the check is dropped and
+    fetched again. Entries are evicted least recently used first once the
+    store exceeds max_bytes.
+
+    Several processes, possibly on several hosts, can share the store: files
+    and records are written under unique temporary names and renamed into
+    place, and no record is ever read, changed and written back.
+    """
+
+    def __init__(self, root, max_bytes=20 * 1024 ** 3):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def entry_dir(self, video_id, format_spec):
+        return os.path.join(self.root, f"{video_id}-{format_key(format_spec)}")
+
+    def _record_path(self, directory, kind):
+        return os.path.join(directory, f"{kind}.json")
+
+    def get(self, video_id, format_spec, kind):
+        """Path of a stored file that passes its integrity check, or None"""
+        directory = self.entry_dir(video_id, format_spec)
+        record_path = self._record_path(directory, kind)
+        try:
+            with open(record_path, 'r', encoding='utf-8') as f:
+                item = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        path = os.path.join(directory, item['file'])
+        try:
+            valid = (os.path.getsize(path) == item['size']
+                     and fingerprint(path) == item['fingerprint'])
+        except FileNotFoundError:
+            valid = False
+
+        if not valid:
+            for stale in (record_path, path):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+            return None
+
+        os.utime(directory)  # mark as recently used
+        return path
+
+    def put(self, video_id, format_spec, kind, src_path, move=True):
+        """Add a file to the store and return its stored path"""
+        directory = self.entry_dir(video_id, format_spec)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{kind}{os.path.splitext(src_path)[1]}"
+        path = os.path.join(directory, name)
+
+        # Another job may be storing the same file at the same time
+        fd, staging = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        os.close(fd)
+        try:
+            if move:
+                shutil.move(src_path, staging)
+            else:
+                shutil.copyfile(src_path, staging)
+            item = {
+                'file': name,
+                'size': os.path.getsize(staging),
+                'fingerprint': fingerprint(staging),
+                'stored_at': time.time(),
+            }
+            os.replace(staging, path)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+        write_atomic(self._record_path(directory, kind),
+                     json.dumps(item, ensure_ascii=False).encode('utf-8'))
+        self.evict(keep=directory)
+        return path
+
+    def evict(self, keep=None):
+        """Delete least recently used entries until the store fits its quota"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if not os.path.isdir(directory):
+                continue
+            size = 0
+            for dirpath, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    try:
+                        size += os.path.getsize(os.path.join(dirpath, filename))
+                    except FileNotFoundError:
+                        pass
+            try:
+                last_used = os.path.getmtime(directory)
+            except FileNotFoundError:
+                continue  # evicted by another process
+            entries.append((last_used, size, directory))
+            total += size
+
+        entries.sort()
+        for _, size, directory in entries:
+            if total <= self.max_bytes:
+                break
+            if directory == keep:
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            total -= size
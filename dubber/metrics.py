@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from .paths import write_atomic
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where unavailable"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class JobMetrics:
+    """Timing spans, byte counts and peak RSS for one job; safe to update from any thread
+
+    Spans with the same name accumulate, so per-segment operations such as
+    'tts_request' report a count, total and maximum. Peak RSS is recorded
+    when each span ends; it is the process peak, so a stage that raised it
+    shows a jump compared to the stages before it.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.spans = {}
+        self.bytes = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        rss = peak_rss_bytes()
+        with self._lock:
+            span = self.spans.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0,
+                                                'peak_rss_bytes': None})
+            span['count'] += 1
+            span['seconds'] += seconds
+            span['max_seconds'] = max(span['max_seconds'], seconds)
+            span['peak_rss_bytes'] = rss
+
+    def add_bytes(self, name, count):
+        with self._lock:
+            self.bytes[name] = self.bytes.get(name, 0) + count
+
+    def increment(self, name, count=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'started': self.started,
+                'wall_seconds': time.time() - self.started,
+                'peak_rss_bytes': peak_rss_bytes(),
+                'spans': {name: dict(span) for name, span in self.spans.items()},
+                'bytes': dict(self.bytes),
+                'counters': dict(self.counters),
+            }
+
+    def write_json(self, path, **extra):
+        data = dict(self.to_dict(), **extra)
+        write_atomic(path, json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+
+
+class PrometheusFile:
+    """Running totals for a long-lived worker, rewritten as a Prometheus text file after each job
+
+    Point node_exporter's textfile collector at the file. Totals cover the
+    jobs recorded by this instance, so each worker process needs its own
+    file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.jobs = {'done': 0, 'failed': 0}
+        self.span_seconds = {}
+        self.span_count = {}
+        self.bytes = {}
+        self.last_job_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_job(self, metrics, status):
+        data = metrics.to_dict()
+        with self._lock:
+            self.jobs[status] = self.jobs.get(status, 0) + 1
+            for name, span in data['spans'].items():
+                self.span_seconds[name] = self.span_seconds.get(name, 0.0) + span['seconds']
+                self.span_count[name] = self.span_count.get(name, 0) + span['count']
+            for name, count in data['bytes'].items():
+                self.bytes[name] = self.bytes.get(name, 0) + count
+            self.last_job_seconds = data['wall_seconds']
+            self.write()
+
+    def write(self):
+        lines = [
+            "# HELP dubber_jobs_total Finished dubbing jobs by outcome.",
+            "# TYPE dubber_jobs_total counter",
+        ]
+        lines += [f'dubber_jobs_total{{status="{status}"}} {count}' for status, count in self.jobs.items()]
+        lines += [
+            "# HELP dubber_stage_seconds_total Time spent in each stage or operation.",
+            "# TYPE dubber_stage_seconds_total counter",
+        ]
+        lines += [f'dubber_stage_seconds_total{{stage="{name}"}} {seconds:.6f}'
+                  for name, seconds in sorted(self.span_seconds.items())]
+        lines += [
+            "# HELP dubber_stage_calls_total Times each stage or operation ran.",
+            "# TYPE dubber_stage_calls_total counter",
+        ]
+        lines += [f'dubber_stage_calls_total{{stage="{name}"}} {count}'
+                  for name, count in sorted(self.span_count.items())]
+        lines += [
+            "# HELP dubber_bytes_total Bytes processed by kind.",
+            "# TYPE dubber_bytes_total counter",
+        ]
+        lines += [f'dubber_bytes_total{{kind="{name}"}} {count}' for name, count in sorted(self.bytes.items())]
+        lines += [
+            "# HELP dubber_last_job_seconds Wall time of the most recent job.",
+            "# TYPE dubber_last_job_seconds gauge",
+            f"dubber_last_job_seconds {self.last_job_seconds:.3f}",
+        ]
+        rss = peak_rss_bytes()
+        if rss is not None:
+            lines += [
+                "# HELP dubber_peak_rss_bytes Peak resident memory of the worker process.",
+                "# TYPE dubber_peak_rss_bytes gauge",
+                f"dubber_peak_rss_bytes {rss}",
+            ]
+        write_atomic(self.path, ("\n".join(lines) + "\n").encode('utf-8'))
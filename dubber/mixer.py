@@ -0,0 +1,147 @@
+import numpy as np
+
+
+def to_mono(data):
+    if data.ndim > 1:
+        return data.mean(axis=1)
+    return data
+
+
+def resample(data, source_rate, target_rate):
+    """Linear-interpolation resample of a mono signal"""
+    if source_rate == target_rate or len(data) == 0:
+        return data
+    length = int(round(len(data) * target_rate / source_rate))
+    positions = np.linspace(0, len(data) - 1, num=length)
+    return np.interp(positions, np.arange(len(data)), data).astype(data.dtype, copy=False)
+
+
+def time_compress(data, ratio, frame_size=1024):
+    """Shorten a mono signal by ratio with windowed overlap-add, keeping its pitch"""
+    if ratio <= 1.0:
+        return data
+
+    synthesis_hop = frame_size // 2
+    analysis_hop = synthesis_hop * ratio
+    if len(data) < frame_size * 2:
+        # Too short for overlap-add; plain resampling is inaudible at this length
+        return resample(data, len(data), int(len(data) / ratio))
+
+    frame_count = 1 + int((len(data) - frame_size) // analysis_hop)
+    starts = (np.arange(frame_count) * analysis_hop).astype(np.int64)
+    frames = data[starts[:, None] + np.arange(frame_size)[None, :]]
+    # A periodic Hann window sums to one at 50% overlap
+    frames = frames * np.hanning(frame_size + 1)[:-1].astype(data.dtype)
+
+    output = np.zeros((frame_count + 1) * synthesis_hop, dtype=data.dtype)
+    output[:frame_count * synthesis_hop] += frames[:, :synthesis_hop].reshape(-1)
+    output[synthesis_hop:] += frames[:, synthesis_hop:].reshape(-1)
+    return output
+
+
+class TimelineMixer:
+    """Places dubbed segments at their cue times in one preallocated buffer"""
+
+    def __init__(self, sample_rate, duration, max_speedup=1.6):
+        self.sample_rate = sample_rate
+        self.duration = duration
+        self.max_speedup = max_speedup
+        self.length = int(np.ceil(duration * sample_rate))
+        self.buffer = np.zeros(self.length, dtype=np.float32)
+
+    def fit(self, data, start, slot_end):
+        """Sample offset and audio of data as place() mixes it in"""
+        data = to_mono(np.asarray(data, dtype=np.float32))
+        offset = int(round(start * self.sample_rate))
+        if offset >= self.length or len(data) == 0:
+            return offset, data[:0]
+
+        slot = max(1, int(round(slot_end * self.sample_rate)) - offset)
+        if len(data) > slot:
+            data = time_compress(data, min(len(data) / slot, self.max_speedup))
+
+        # Anything still too long overlaps what follows instead of being cut
+        end = min(offset + len(data), self.length)
+        return offset, data[:end - offset]
+
+    def place(self, data, start, slot_end):
+        """Mix data in at start seconds, compressing it if it runs past slot_end
+
+        Returns the range of samples the audio covers.
+        """
+        offset, data = self.fit(data, start, slot_end)
+        if len(data):
+            self.write(offset, data)
+        return offset, offset + len(data)
+
+    def write(self, offset, data):
+        self.buffer[offset:offset + len(data)] += data
+
+    def flush_until(self, seconds):
+        """Mark audio before seconds as final; only streaming mixers act on it"""
+
+    def finish(self):
+        np.clip(self.buffer, -1.0, 1.0, out=self.buffer)
+        return self.buffer
+
+
+class StreamingMixer(TimelineMixer):
+    """Timeline mixer that hands finished audio to sink in fixed-size blocks
+
+    Only blocks between the flush point and the furthest placed segment are
+    kept, so memory depends on how far synthesis runs ahead, not on the
+    length of the video. A mixer without a sink holds everything until one
+    is attached.
+    """
+
+    def __init__(self, sample_rate, duration, sink, max_speedup=1.6, block_seconds=10):
+        self.sample_rate = sample_rate
+        self.duration = duration
+        self.max_speedup = max_speedup
+        self.length = int(np.ceil(duration * sample_rate))
+        self.sink = sink
+        self.block_size = int(block_seconds * sample_rate)
+        self.blocks = {}
+        self.next_block = 0
+
+    def _block(self, index):
+        block = self.blocks.get(index)
+        if block is None:
+            size = min(self.block_size, self.length - index * self.block_size)
+            block = self.blocks[index] = np.zeros(size, dtype=np.float32)
+        return block
+
+    def write(self, offset, data):
+        position = 0
+        while position < len(data):
+            index, block_offset = divmod(offset + position, self.block_size)
+            if index < self.next_block:
+                raise Exception("Segment placed in audio that was already streamed")
+            block = self._block(index)
+            count = min(len(data) - position, len(block) - block_offset)
+            block[block_offset:block_offset + count] += data[position:position + count]
+            position += count
+
+    def flush_until(self, seconds):
+        self._flush(min(int(seconds * self.sample_rate), self.length) // self.block_size)
+
+    def attach(self, sink):
+        """Set the sink for a mixer created without one; held blocks go out on the next flush"""
+        self.sink = sink
+
+    def _flush(self, last_block):
+        if self.sink is None:
+            return
+        while self.next_block < last_block:
+            block = self.blocks.pop(self.next_block, None)
+            if block is None:
+                block = self._block(self.next_block)
+                del self.blocks[self.next_block]
+            self.sink(np.clip(block, -1.0, 1.0, out=block))
+            self.next_block += 1
+
+    def finish(self):
+        if self.sink is None:
+            raise Exception("Streaming mixer finished without a sink")
+        # Include the final, possibly shorter, block
+        self._flush(-(-self.length // self.block_size))
@@ -0,0 +1,102 @@
+import os
+import subprocess
+
+# ISO 639-1 to the ISO 639-2 codes MP4 requires for track language tags
+ISO639_2 = {
+    'ar': 'ara', 'de': 'deu', 'en': 'eng', 'es': 'spa', 'fa': 'fas', 'fr': 'fra',
+    'hi': 'hin', 'id': 'ind', 'it': 'ita', 'ja': 'jpn', 'ko': 'kor', 'nl': 'nld',
+    'pl': 'pol', 'pt': 'por', 'ru': 'rus', 'sv': 'swe', 'tr': 'tur', 'uk': 'ukr',
+    'ur': 'urd', 'zh-CN': 'zho', 'zh-TW': 'zho',
+}
+
+
+def audio_track_args(languages):
+    """-map and language tags for the video from input 0 and one dubbed track per input after it"""
+    args = ['-map', '0:v:0']
+    for i, lang in enumerate(languages):
+        args += ['-map', f'{i + 1}:a:0']
+        if lang:
+            args += [f'-metadata:s:a:{i}', f'language={ISO639_2.get(lang, lang)}']
+    return args
+
+
+class StreamingMux:
+    """ffmpeg process that muxes the video with raw PCM tracks written to pipes
+
+    The dubbed tracks are encoded while they are being mixed, so no
+    intermediate WAV file is written and memory stays bounded for long
+    videos. A single track goes through stdin; several tracks each get their
+    own pipe, which needs a POSIX system.
+    """
+
+    def __init__(self, video_path, output_video, sample_rate, languages=None):
+        self.output_video = output_video
+        self.languages = list(languages or [None])
+        self.pipes = {}
+
+        inputs = []
+        read_fds = []
+        if len(self.languages) == 1:
+            inputs += ['-f', 'f32le', '-ar', str(sample_rate), '-ac', '1', '-i', 'pipe:0']
+        else:
+            for lang in self.languages:
+                read_fd, write_fd = os.pipe()
+                read_fds.append(read_fd)
+                self.pipes[lang] = os.fdopen(write_fd, 'wb')
+                inputs += ['-f', 'f32le', '-ar', str(sample_rate), '-ac', '1', '-i', f'pipe:{read_fd}']
+
+        try:
+            self.process = subprocess.Popen([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-i', video_path,
+                *inputs,
+                *audio_track_args(self.languages),
+                '-c:v', 'copy',
+                '-c:a', 'aac',
+                '-max_muxing_queue_size', '4096',
+                output_video
+            ], stdin=subprocess.PIPE if not read_fds else subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL, pass_fds=read_fds)
+        finally:
+            # ffmpeg holds its own copies of the read ends
+            for read_fd in read_fds:
+                os.close(read_fd)
+
+        if not read_fds:
+            self.pipes[self.languages[0]] = self.process.stdin
+
+    def writer(self, lang):
+        """Function that appends mono float32 samples to lang's track"""
+        pipe = self.pipes[lang]
+
+        def write(samples):
+            try:
+                pipe.write(samples.astype('<f4', copy=False).tobytes())
+            except (BrokenPipeError, ValueError):
+                raise Exception(f"ffmpeg exited early with code {self.process.wait()}")
+
+        return write
+
+    def _close_pipes(self):
+        for pipe in self.pipes.values():
+            try:
+                pipe.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    def close(self):
+        """Finish the audio streams and wait for ffmpeg to write the output"""
+        self._close_pipes()
+        returncode = self.process.wait()
+        if returncode != 0:
+            raise Exception(f"ffmpeg failed with code {returncode}")
+        return self.output_video
+
+    def abort(self):
+        """Stop ffmpeg and remove the partial output"""
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
+        self._close_pipes()
+        if os.path.exists(self.output_video):
+            os.remove(self.output_video)
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+
+def default_cache_dir():
+    """Directory for persistent caches; override with DUBBER_CACHE_DIR"""
+    return os.environ.get("DUBBER_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "dubber")
+
+
+def default_scratch_dir():
+    """Root for per-job scratch workspaces; override with DUBBER_SCRATCH_DIR (e.g. /dev/shm)"""
+    return os.environ.get("DUBBER_SCRATCH_DIR") or tempfile.gettempdir()
+
+
+def write_atomic(path, data):
+    """Write bytes so readers see either the old or the new file, never a partial one"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,1177 @@
+import copy
+import os
+import re
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+# yt_dlp, numpy, soundfile and the mixers are imported by the stages that use
+# them, so importing the pipeline (and starting a worker) stays cheap
+from .subtitles import cues_in_range, normalize_cues, parse_subtitle_text, parse_subtitle_file
+from .audio_cache import AudioCache
+from .audio_io import SAMPLE_RATE, decode_audio
+from .manifest import JobManifest, cues_from_json, cues_to_json
+from .media_store import MediaStore
+from .metrics import JobMetrics
+from .mux import StreamingMux, audio_track_args
+from .incremental import (RenderRecord, TrackPatch, diff_placements, merge_intervals,
+                          overlaps, placement_key)
+from .paths import default_cache_dir
+from .ratelimit import client_counters
+from .translation import GoogleTranslateBackend, TranslationStage
+from .translation_cache import TranslationCache
+from .tts import GTTSBackend, SegmentSynthesizer
+from .workspace import JobWorkspace
+
+
+VIDEO_FORMAT = 'bestvideo+bestaudio/best'
+
+# Above this fraction of changed cues an incremental re-dub falls back to a full run
+INCREMENTAL_MAX_CHANGED = 0.25
+
+
+class JobInputError(Exception):
+    """A problem with the job itself, such as a bad URL or missing subtitles; retrying will not help"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its client has cancelled it"""
+
+
+def ytdlp_input_error(error):
+    """Whether yt-dlp failed because of the URL or the video (unsupported, private, removed)"""
+    exc_info = getattr(error, 'exc_info', None)
+    cause = exc_info[1] if exc_info and exc_info[1] is not None else error
+    # yt-dlp marks errors that it knows are not transient as expected
+    return bool(getattr(cause, 'expected', False))
+
+
+def run_in_background(fn, *args):
+    """Run fn in a daemon thread and return a Future for its result"""
+    future = Future()
+
+    def target():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future
+
+
+class DubbingJob:
+    """Inputs for a single dubbing run, independent of any UI
+
+    With target_langs the job produces one dubbed audio track per language,
+    all muxed into the same output file. With preview=(start, end) in
+    seconds only that part of the video is downloaded and dubbed, into a
+    short clip.
+    """
+
+    def __init__(self, url, output_dir, target_lang="ar", source_lang=None,
+                 subtitle_text=None, subtitle_path=None, target_langs=None,
+                 output_format="mp4", preview=None):
+        self.url = url
+        self.output_dir = output_dir
+        self.target_langs = list(target_langs) if target_langs else None
+        self.target_lang = self.target_langs[0] if self.target_langs else target_lang
+        self.source_lang = source_lang or None
+        self.subtitle_text = subtitle_text or None
+        self.subtitle_path = subtitle_path or None
+        self.output_format = output_format
+        self.preview = list(preview) if preview else None
+
+    @property
+    def languages(self):
+        """Target languages in track order"""
+        return self.target_langs or [self.target_lang]
+
+    def to_dict(self):
+        """Plain dict form, used to hand jobs to worker processes"""
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class DubbingPipeline:
+    """Runs download → subtitles → translate → TTS → mix → mux without a GUI"""
+
+    def __init__(self, status_callback=None, progress_callback=None, pause_check=None,
+                 tts_workers=4, tts_retries=2, translator_factory=None,
+                 use_cache=True, cache_dir=None, audio_cache_bytes=2 * 1024 ** 3,
+                 stream_mux=True, resume=True, media_store_bytes=20 * 1024 ** 3,
+                 fragment_downloads=4, events=None, write_metrics=True, prometheus=None,
+                 tts_backend=None, normalize=True, max_cue_seconds=8.0, scratch_dir=None,
+                 incremental=False, stage_limits=None,
+                 info_cache=None, cancel_check=None):
+        self.status_callback = status_callback
+        self.progress_callback = progress_callback
+        self.pause_check = pause_check
+        # Returns True once the job should stop, e.g. when a queue worker lost its lease
+        self.cancel_check = cancel_check
+        # EventBus that receives status, progress, error and done events
+        self.events = events
+        self.tts_workers = tts_workers
+        self.tts_retries = tts_retries
+        self.stream_mux = stream_mux
+        self.resume = resume
+        self.fragment_downloads = fragment_downloads
+        self.write_metrics = write_metrics
+        # Merge rolling and fragmentary cues into sentences before translation
+        self.normalize = normalize
+        self.max_cue_seconds = max_cue_seconds
+        # Optional PrometheusFile that accumulates totals across jobs
+        self.prometheus = prometheus
+        self.metrics = JobMetrics()
+        # Called as translator_factory(source_lang, target_lang); must return
+        # an object with translate_batch(texts)
+        self.translator_factory = translator_factory or GoogleTranslateBackend
+        # Object with name, voice and synthesize(text, lang) returning encoded
+        # audio bytes; called from several threads at once
+        self.tts_backend = tts_backend or GTTSBackend()
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.audio_cache_bytes = audio_cache_bytes
+        self.media_store_bytes = media_store_bytes
+        # Root for per-job workspaces holding downloads and intermediate audio;
+        # a tmpfs such as /dev/shm keeps them off the disk
+        self.scratch_dir = scratch_dir
+        # Keep each run's mixed tracks so a run after a subtitle edit only
+        # redoes the cues that changed
+        self.incremental = incremental
+        # Optional StageLimits shared with other jobs, capping how many run
+        # downloads, other network-bound stages and CPU-bound stages at the
+        # same time
+        self.stage_limits = stage_limits
+        self._held_slots = {}
+        self._slot_locks = {kind: threading.Lock() for kind in ('download', 'network', 'cpu')}
+        # Optional VideoInfoCache; a video whose info the UI already loaded
+        # is not extracted again
+        self.info_cache = info_cache
+        self.output_video = None
+        self._translation_cache = None
+        self._audio_cache = None
+        self._media_store = None
+        self._language_progress = {}
+
+    @property
+    def translation_cache(self):
+        if self.use_cache and self._translation_cache is None:
+            self._translation_cache = TranslationCache(
+                os.path.join(self.cache_dir, "translations.sqlite3"))
+        return self._translation_cache
+
+    @property
+    def audio_cache(self):
+        if self.use_cache and self._audio_cache is None:
+            self._audio_cache = AudioCache(os.path.join(self.cache_dir, "audio"),
+                                           max_bytes=self.audio_cache_bytes)
+        return self._audio_cache
+
+    @property
+    def media_store(self):
+        if self.use_cache and self._media_store is None:
+            self._media_store = MediaStore(os.path.join(self.cache_dir, "media"),
+                                           max_bytes=self.media_store_bytes)
+        return self._media_store
+
+    def publish(self, event_type, **fields):
+        if self.events:
+            self.events.publish(event_type, **fields)
+
+    def update_status(self, message):
+        if self.status_callback:
+            self.status_callback(message)
+        self.publish('status', message=message)
+
+    def update_progress(self, value):
+        if self.progress_callback:
+            self.progress_callback(value)
+        self.publish('progress', value=value)
+
+    def update_language_progress(self, lang, fraction):
+        """Report one language's share of the translate and TTS stages (40-70%)"""
+        self._language_progress[lang] = fraction
+        self.update_progress(40 + 30 * sum(self._language_progress.values()) / len(self._language_progress))
+
+    def check_cancelled(self):
+        """Raise JobCancelled once the client has cancelled the job"""
+        if self.cancel_check and self.cancel_check():
+            raise JobCancelled("The job was cancelled")
+
+    def acquire_stage_slot(self, kind):
+        """Take one of the shared 'download', 'network' or 'cpu' slots
+
+        The slot belongs to the job: while one of its threads holds it, the
+        others enter without waiting, so a job never waits for itself.
+        """
+        with self._slot_locks[kind]:
+            if self._held_slots.get(kind):
+                self._held_slots[kind] += 1
+                return
+            with self.metrics.span(f'{kind}_slot_wait'):
+                self.stage_limits.acquire(kind)
+            self._held_slots[kind] = 1
+
+    def release_stage_slot(self, kind):
+        with self._slot_locks[kind]:
+            self._held_slots[kind] -= 1
+            if not self._held_slots[kind]:
+                self.stage_limits.release(kind)
+
+    @contextmanager
+    def stage_slot(self, kind):
+        """Hold a shared stage slot for the block, if the pipeline has limits"""
+        if self.stage_limits is None:
+            yield
+            return
+        self.acquire_stage_slot(kind)
+        try:
+            yield
+        finally:
+            self.release_stage_slot(kind)
+
+    def run(self, job):
+        """Run the whole pipeline for one job and return the output video path"""
+        self.metrics = JobMetrics()
+        self.output_video = None
+        status = 'failed'
+        error = None
+        backends_before = client_counters()
+        try:
+            with self.metrics.span('total'):
+                output_video = self.run_stages(job)
+            status = 'done'
+        except Exception as e:
+            error = str(e)
+            self.publish('error', message=error)
+            raise
+        finally:
+            self.record_backend_counters(backends_before)
+            self.save_metrics(job, status, error)
+        self.publish('done', output=output_video)
+        return output_video
+
+    def output_path(self, job, video_id=None):
+        """Output file named after the video and its languages, so jobs sharing a directory never collide"""
+        name = re.sub(r'[^\w-]+', '_', video_id or JobManifest.job_key(job))
+        name = f"{name}.{'-'.join(job.languages)}"
+        if job.preview:
+            name += f".preview-{job.preview[0]:g}-{job.preview[1]:g}"
+        return os.path.join(job.output_dir, f"{name}.{job.output_format}")
+
+    def partial_path(self, output_video):
+        """Where ffmpeg writes until the output is complete; keeps the extension ffmpeg needs"""
+        base, ext = os.path.splitext(output_video)
+        return f"{base}.part{ext}"
+
+    def record_backend_counters(self, before):
+        """Add what the shared backend clients counted during this job, e.g. gtts_throttled"""
+        for name, counters in client_counters().items():
+            for counter in ('requests', 'throttled', 'retried', 'failed'):
+                count = counters[counter] - before.get(name, {}).get(counter, 0)
+                if count:
+                    self.metrics.increment(f"{name}_{counter}", count)
+
+    def save_metrics(self, job, status, error=None):
+        """Write the job's metrics JSON next to its output and update the Prometheus file"""
+        data = dict(self.metrics.to_dict(), url=job.url, languages=job.languages,
+                    status=status, error=error)
+        self.publish('metrics', metrics=data)
+        try:
+            if self.write_metrics:
+                os.makedirs(job.output_dir, exist_ok=True)
+                # Before the metadata is known the name falls back to the job key
+                output_video = self.output_video or self.output_path(job)
+                self.metrics.write_json(os.path.splitext(output_video)[0] + ".metrics.json",
+                                        url=job.url, languages=job.languages,
+                                        status=status, error=error)
+            if self.prometheus is not None:
+                self.prometheus.record_job(self.metrics, status)
+        except OSError as e:
+            # Metrics must never fail a job
+            self.update_status(f"Could not write metrics: {str(e)}")
+
+    def load_metadata(self, job, workspace, manifest=None):
+        """The video info and subtitle file, from the manifest or fetched into the workspace"""
+        metadata = manifest.stage('metadata') if manifest else None
+        if metadata and metadata['subtitle_path'] and not os.path.exists(metadata['subtitle_path']):
+            metadata = None  # kept only in an earlier attempt's workspace
+        if metadata is None:
+            self.update_status("جاري تحميل معلومات الفيديو...")
+            with self.stage_slot('network'), self.metrics.span('metadata'):
+                metadata = self.fetch_metadata(job.url, workspace.directory, job.source_lang)
+            if manifest:
+                manifest.reset_from('metadata')
+                manifest.complete_stage('metadata', self.info_checkpoint(metadata))
+        return metadata
+
+    def load_subtitles(self, job, metadata, manifest=None):
+        """The job's cues, from the manifest or parsed and normalized"""
+        cues = manifest.stage('subtitles') if manifest else None
+        if cues is not None:
+            return cues_from_json(cues)
+        try:
+            with self.metrics.span('subtitles'):
+                subtitle_info = self.get_subtitles(job, metadata['subtitle_path'])
+                if self.normalize:
+                    subtitle_info = self.normalize_subtitles(subtitle_info)
+        except JobInputError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error with subtitles: {str(e)}")
+        if manifest and subtitle_info:
+            manifest.reset_from('subtitles')
+            manifest.complete_stage('subtitles', cues_to_json(subtitle_info))
+        return subtitle_info
+
+    def run_stage(self, job, stage):
+        """Run one stage of a job ahead of the job itself, checkpointed in its manifest
+
+        Lets queue workers split a job into 'download' and 'translation'
+        tasks, possibly on other hosts sharing the output directory; the
+        full run then resumes from what they saved. Previews cannot be
+        split, because their download depends on the cues.
+        """
+        if job.preview:
+            raise JobInputError("A preview cannot be run stage by stage")
+        if stage == 'download' and self.media_store is None:
+            # The video would be deleted along with this task's workspace
+            raise JobInputError("Downloading ahead of the job needs the media store")
+        manifest = JobManifest.for_job(job)
+        with JobWorkspace(self.scratch_dir, JobManifest.job_key(job)) as workspace:
+            metadata = self.load_metadata(job, workspace, manifest)
+            if stage == 'download':
+                return self.download_checkpointed(job, metadata['video_info'], manifest,
+                                                  workspace=workspace)['video_path']
+        if stage != 'translation':
+            raise JobInputError(f"Unknown stage: {stage}")
+
+        subtitle_info = self.load_subtitles(job, metadata, manifest)
+        if not subtitle_info:
+            raise JobInputError("لم يتم العثور على ترجمة")
+        translations = manifest.stage('translation') or {}
+        for lang in job.languages:
+            self.check_cancelled()
+            if lang not in translations:
+                self.update_status(f"جاري ترجمة النصوص ({lang})...")
+                with self.stage_slot('network'), self.metrics.span('translation'):
+                    translated_texts = self.translate_texts(subtitle_info, job.source_lang, lang)
+                manifest.clear_segments(lang)
+                manifest.update_stage('translation', lang, translated_texts)
+        return job.languages
+
+    def run_stages(self, job):
+        # Downloads go to the workspace, so nothing else creates the output directory
+        os.makedirs(job.output_dir, exist_ok=True)
+        manifest = JobManifest.for_job(job) if self.resume else None
+
+        # Downloads, subtitle files and scratch audio stay private to this
+        # attempt, so two jobs for the same video never write to the same file
+        workspace = JobWorkspace(self.scratch_dir, JobManifest.job_key(job))
+        download = None
+        try:
+            metadata = self.load_metadata(job, workspace, manifest)
+            duration = metadata['video_info'].get('duration')
+            video_id = metadata['video_info'].get('id')
+            output_video = self.output_video = self.output_path(job, video_id)
+            render = RenderRecord.for_job(job) if self.incremental and not job.preview else None
+            # An earlier render of this video can be patched without downloading it again
+            previous_render = render is not None and render.usable(
+                video_id, output_video, self.tts_backend, job.languages)
+
+            # Only the final mux needs the media, so download it while the rest runs;
+            # a preview knows which part to fetch once it has the cues
+            if not previous_render and not job.preview:
+                self.update_status("جاري تنزيل الفيديو...")
+                download = run_in_background(self.download_checkpointed, job, metadata['video_info'],
+                                             manifest, None, workspace)
+
+            self.update_progress(30)
+            self.update_status("جاري تحليل الترجمة...")
+
+            subtitle_info = self.load_subtitles(job, metadata, manifest)
+            if not subtitle_info:
+                raise JobInputError("لم يتم العثور على ترجمة")
+            self.check_cancelled()
+
+            section = None
+            if job.preview:
+                # Only the cues in the range are dubbed, on a timeline starting at the range
+                subtitle_info, *section = cues_in_range(subtitle_info, *job.preview)
+                if not subtitle_info:
+                    raise JobInputError(f"No subtitles between {job.preview[0]:g}s and {job.preview[1]:g}s")
+                duration = section[1] - section[0]
+                self.update_status(f"Preview {section[0]:g}-{section[1]:g}s: {len(subtitle_info)} cues")
+
+            self.update_progress(40)
+            self._language_progress = {lang: 0.0 for lang in job.languages}
+            # Open the shared caches before languages start using them from several threads
+            self.translation_cache, self.audio_cache
+
+            # A failed job leaves neither a truncated video nor scratch files behind
+            partial_video = self.partial_path(output_video)
+            try:
+                if not (previous_render and self.redub_changed(job, subtitle_info, duration, render,
+                                                               output_video, partial_video)):
+                    if download is None:
+                        self.update_status("جاري تنزيل الفيديو...")
+                        download = run_in_background(self.download_checkpointed, job,
+                                                     metadata['video_info'], manifest, section, workspace)
+                    # Several streamed tracks need one pipe each, which only POSIX can pass to ffmpeg
+                    if self.stream_mux and (len(job.languages) == 1 or os.name == 'posix'):
+                        tracks = self.dub_streaming(download, job, subtitle_info, duration, partial_video,
+                                                    manifest, render)
+                    else:
+                        tracks = self.dub_with_temp_file(download, job, subtitle_info, duration,
+                                                         partial_video, workspace, manifest, render)
+                    os.replace(partial_video, output_video)
+                    if render is not None:
+                        render.save(video_id, self.tts_backend, tracks)
+            finally:
+                if os.path.exists(partial_video):
+                    os.remove(partial_video)
+                if render is not None:
+                    render.discard_partial_tracks()
+        finally:
+            if download is not None and not download.done():
+                # A failed job's download is still writing into the workspace
+                download.add_done_callback(lambda _: workspace.cleanup())
+            else:
+                workspace.cleanup()
+        self.metrics.add_bytes('output', os.path.getsize(output_video))
+        if manifest:
+            # Checkpoints only matter until the output exists, and each subtitle
+            # edit gets a key of its own, so they would pile up
+            manifest.discard()
+
+        self.update_progress(100)
+        self.update_status("!تمت عملية الدبلجة بنجاح")
+        return output_video
+
+    def dub_language(self, job, lang, subtitle_info, mixer, manifest=None, after_place=None,
+                     placements=None):
+        """Translate the cues into lang, synthesize them into mixer and return the translations"""
+        self.check_cancelled()
+        label = f" ({lang})" if len(job.languages) > 1 else ""
+        translations = manifest.stage('translation') if manifest else None
+        translated_texts = translations.get(lang) if translations else None
+        if translated_texts is None:
+            self.update_status(f"جاري ترجمة النصوص{label}...")
+            with self.stage_slot('network'), self.metrics.span('translation'):
+                translated_texts = self.translate_texts(
+                    subtitle_info, job.source_lang, lang,
+                    progress_callback=lambda fraction: self.update_language_progress(lang, fraction / 3))
+            if manifest:
+                # Segments saved for an older translation no longer match it
+                manifest.clear_segments(lang)
+                manifest.update_stage('translation', lang, translated_texts)
+
+        self.update_language_progress(lang, 1 / 3)
+        self.update_status(f"جاري تحويل النص إلى كلام{label}...")
+        with self.metrics.span('synthesis'):
+            self.synthesize_speech(translated_texts, subtitle_info, lang, mixer, manifest,
+                                   after_place=after_place,
+                                   workers=max(1, self.tts_workers // len(job.languages)),
+                                   placements=placements)
+        return translated_texts
+
+    def for_each_language(self, languages, fn, on_error=None):
+        """Call fn(lang) for every language, in parallel when there are several
+
+        on_error runs as soon as one language fails, so the others can be
+        stopped; the first error is raised once all of them have returned.
+        """
+        if len(languages) == 1:
+            try:
+                fn(languages[0])
+            except BaseException:
+                if on_error:
+                    on_error()
+                raise
+            return
+
+        error = None
+        with ThreadPoolExecutor(max_workers=len(languages)) as executor:
+            futures = [executor.submit(fn, lang) for lang in languages]
+            for future in as_completed(futures):
+                if future.exception() is not None and error is None:
+                    error = future.exception()
+                    if on_error:
+                        on_error()
+        if error is not None:
+            raise error
+
+    def dub_streaming(self, download, job, subtitle_info, duration, output_video, manifest=None,
+                      render=None):
+        """Mix and encode in one pass, piping finished audio into ffmpeg as TTS completes
+
+        Until the background download finishes there is no video to mux
+        into, so the mixers hold finished audio and release it once ffmpeg
+        has been started. ffmpeg reads all tracks together, so every
+        language runs in its own thread and keeps feeding its own pipe.
+        With a RenderRecord the tracks are also written to its partial
+        track files; returns the record's cue lists by language.
+        """
+        import soundfile as sf
+        from .mixer import StreamingMixer
+
+        languages = job.languages
+        track_duration = self.track_duration(subtitle_info, duration)
+        mixers = {lang: StreamingMixer(SAMPLE_RATE, track_duration, None) for lang in languages}
+        track_files = {}
+        if render is not None:
+            track_files = {lang: sf.SoundFile(render.partial_track_path(lang), 'w', SAMPLE_RATE, 1,
+                                              subtype='PCM_16', format='FLAC')
+                           for lang in languages}
+        tracks = {}
+        mux = None
+        mux_lock = threading.Lock()
+        failed = threading.Event()
+
+        def start_mux_when_downloaded():
+            nonlocal mux
+            if failed.is_set():
+                raise Exception("Stopped because another language failed")
+            with mux_lock:
+                if mux is None and download.done():
+                    # Raises here if the download failed, which aborts the TTS stage early
+                    video_path = download.result()['video_path']
+                    try:
+                        mux = StreamingMux(video_path, output_video, SAMPLE_RATE, languages)
+                    except Exception as e:
+                        raise Exception(f"Error in audio processing: {str(e)}")
+                    for lang, mixer in mixers.items():
+                        mixer.attach(self.metered_writer(mux.writer(lang), track_files.get(lang)))
+
+        def dub(lang):
+            placements = [(0, 0)] * len(subtitle_info)
+            translated_texts = self.dub_language(job, lang, subtitle_info, mixers[lang], manifest,
+                                                 after_place=start_mux_when_downloaded,
+                                                 placements=placements)
+            if render is not None:
+                tracks[lang] = self.render_cues(subtitle_info, track_duration, translated_texts, placements)
+            self.update_language_progress(lang, 1.0)
+            if not download.done():
+                self.update_status("جاري انتظار اكتمال تنزيل الفيديو...")
+            with self.metrics.span('download_wait'):
+                download.result()
+            start_mux_when_downloaded()
+
+            self.update_status("جاري إنشاء الفيديو النهائي...")
+            try:
+                # Blocks while ffmpeg encodes what is still held in the mixer;
+                # until then ffmpeg only copies the video and keeps pace with TTS
+                with self.stage_slot('cpu'), self.metrics.span('encode'):
+                    mixers[lang].finish()
+            except Exception as e:
+                raise Exception(f"Error in audio processing: {str(e)}")
+
+        def abort():
+            failed.set()
+            with mux_lock:
+                if mux is not None:
+                    # Unblocks the other languages' pipe writes
+                    mux.abort()
+
+        try:
+            self.for_each_language(languages, dub, on_error=abort)
+            try:
+                with self.stage_slot('cpu'), self.metrics.span('mux'):
+                    mux.close()
+            except Exception as e:
+                mux.abort()
+                raise Exception(f"Error in audio processing: {str(e)}")
+        finally:
+            for track_file in track_files.values():
+                track_file.close()
+        return tracks
+
+    def dub_with_temp_file(self, download, job, subtitle_info, duration, output_video, workspace,
+                           manifest=None, render=None):
+        """Mix each track in memory, write it as a WAV file in the job's workspace and mux them all at once
+
+        With a RenderRecord the tracks are written as its partial track
+        files instead; returns the record's cue lists by language.
+        """
+        import soundfile as sf
+        from .mixer import TimelineMixer
+
+        languages = job.languages
+        track_duration = self.track_duration(subtitle_info, duration)
+        if render is not None:
+            audio_paths = {lang: render.partial_track_path(lang) for lang in languages}
+        else:
+            audio_paths = {lang: workspace.path(f"track_{lang}.wav") for lang in languages}
+        tracks = {}
+
+        def dub(lang):
+            mixer = TimelineMixer(SAMPLE_RATE, track_duration)
+            placements = [(0, 0)] * len(subtitle_info)
+            translated_texts = self.dub_language(job, lang, subtitle_info, mixer, manifest,
+                                                 placements=placements)
+            if render is not None:
+                tracks[lang] = self.render_cues(subtitle_info, track_duration, translated_texts, placements)
+            self.update_language_progress(lang, 1.0)
+            self.update_status("جاري مزامنة الصوت...")
+            try:
+                with self.stage_slot('cpu'), self.metrics.span('mix_write'):
+                    sf.write(audio_paths[lang], mixer.finish(), SAMPLE_RATE, subtype='PCM_16')
+            except Exception as e:
+                raise Exception(f"Error in audio processing: {str(e)}")
+
+        self.for_each_language(languages, dub)
+
+        self.update_progress(80)
+        if not download.done():
+            self.update_status("جاري انتظار اكتمال تنزيل الفيديو...")
+        with self.metrics.span('download_wait'):
+            video_path = download.result()['video_path']
+
+        self.update_status("جاري إنشاء الفيديو النهائي...")
+        try:
+            with self.stage_slot('cpu'), self.metrics.span('mux'):
+                self.mux(video_path, [(lang, audio_paths[lang]) for lang in languages], output_video)
+        except Exception as e:
+            raise Exception(f"Error in audio processing: {str(e)}")
+        return tracks
+
+    def redub_changed(self, job, subtitle_info, duration, render, output_video, partial_video):
+        """Re-dub only the cues that differ from the recorded render and remux the audio
+
+        Changed cues are translated and synthesized again, the regions of
+        the recorded tracks they touch are mixed again, and the new tracks
+        replace the audio of the previous output; its video is copied as it
+        is. Returns False without changing anything when so many cues
+        changed that a full run is about as quick.
+        """
+        import numpy as np
+        from .mixer import StreamingMixer
+
+        languages = job.languages
+        track_duration = self.track_duration(subtitle_info, duration)
+        length = int(np.ceil(track_duration * SAMPLE_RATE))
+        slots = self.cue_slots(subtitle_info, track_duration)
+        plans = {}
+
+        def plan(lang):
+            known = render.translations(lang)
+            missing = [cue for cue in subtitle_info if cue[2] not in known]
+            if missing:
+                with self.stage_slot('network'), self.metrics.span('translation'):
+                    translated = self.translate_texts(missing, job.source_lang, lang)
+                known.update(zip([text for _, _, text in missing], translated))
+            translated_texts = [known[text] for _, _, text in subtitle_info]
+            keys = [placement_key(start, slot_end, translation)
+                    for (start, slot_end), translation in zip(slots, translated_texts)]
+            plans[lang] = (translated_texts, *diff_placements(render.cues(lang), keys))
+
+        self.update_status("Comparing subtitles with the previous render...")
+        self.for_each_language(languages, plan)
+        changed = max(len(added) for _, _, _, added in plans.values())
+        if changed > len(subtitle_info) * INCREMENTAL_MAX_CHANGED:
+            self.update_status(f"{changed} of {len(subtitle_info)} cues changed; dubbing everything again")
+            return False
+        if not any(removed or added for _, _, removed, added in plans.values()):
+            self.update_status("No cues changed since the previous render")
+            return True
+        self.update_status(f"Re-dubbing {changed} changed cues of {len(subtitle_info)}")
+
+        tracks = {}
+
+        def patch(lang):
+            translated_texts, matched, removed, added = plans[lang]
+            placements = [None] * len(subtitle_info)
+            for index, extent in matched.items():
+                placements[index] = extent
+            if not removed and not added:
+                tracks[lang] = self.render_cues(subtitle_info, track_duration, translated_texts, placements)
+                return
+
+            fitter = StreamingMixer(SAMPLE_RATE, track_duration, None)
+            fitted = {}
+
+            def fit(k, samples):
+                index = added[k]
+                fitted[index] = fitter.fit(samples, *slots[index])
+
+            with self.metrics.span('synthesis'):
+                self.synthesize_cues([translated_texts[index] for index in added], lang, fit)
+            for index, (offset, data) in fitted.items():
+                placements[index] = (offset, offset + len(data))
+
+            # Clear where removed cues were heard and where the new ones go,
+            # then mix back every unchanged cue that reaches into those regions
+            regions = merge_intervals(removed + [placements[index] for index in added])
+            track_patch = TrackPatch(fitter, regions)
+            for offset, data in fitted.values():
+                track_patch.add(offset, data)
+            neighbours = [index for index, extent in matched.items() if overlaps(extent, regions)]
+            with self.metrics.span('synthesis'):
+                self.synthesize_cues([translated_texts[index] for index in neighbours], lang,
+                                     lambda k, samples: track_patch.place(samples, *slots[neighbours[k]]))
+
+            with self.stage_slot('cpu'), self.metrics.span('mix_write'):
+                track_patch.write(render.track_path(lang), render.partial_track_path(lang), length)
+            tracks[lang] = self.render_cues(subtitle_info, track_duration, translated_texts, placements)
+            self.metrics.increment('cues_redubbed', len(added))
+            self.update_language_progress(lang, 1.0)
+
+        self.for_each_language(languages, patch)
+
+        self.update_status("جاري إنشاء الفيديو النهائي...")
+        audio_tracks = []
+        for lang in languages:
+            path = render.partial_track_path(lang)
+            audio_tracks.append((lang, path if os.path.exists(path) else render.track_path(lang)))
+        try:
+            with self.stage_slot('cpu'), self.metrics.span('mux'):
+                # The previous output already holds the video stream
+                self.mux(output_video, audio_tracks, partial_video)
+        except Exception as e:
+            raise Exception(f"Error in audio processing: {str(e)}")
+        os.replace(partial_video, output_video)
+        render.save(render.data['video_id'], self.tts_backend, tracks)
+        return True
+
+    def synthesize_cues(self, texts, lang, result_callback):
+        """Synthesize and decode texts, calling result_callback(index, samples) as each one finishes"""
+        import numpy as np
+
+        cache = self.audio_cache
+
+        def synthesize(index, text):
+            if not text.strip():
+                return np.zeros(0, dtype=np.float32)
+            try:
+                data = self.synthesize_segment(text, lang, cache)
+                with self.stage_slot('cpu'), self.metrics.span('decode'):
+                    return decode_audio(data, SAMPLE_RATE)
+            except Exception as e:
+                raise Exception(f"Error in speech generation: {str(e)}")
+
+        def place(index, samples):
+            try:
+                result_callback(index, samples)
+            except Exception as e:
+                raise Exception(f"Error in audio processing: {str(e)}")
+
+        self.segment_synthesizer(synthesize).run(texts, result_callback=place)
+
+    def metered_writer(self, write, track_file=None):
+        """Wrap a PCM writer so the bytes sent to ffmpeg are counted and, with track_file, kept"""
+        def metered(samples):
+            self.metrics.add_bytes('pcm_streamed', samples.nbytes)
+            if track_file is not None:
+                track_file.write(samples)
+            write(samples)
+        return metered
+
+    def info_checkpoint(self, result):
+        """Result dict without the bulky parts of the yt-dlp info dict"""
+        info = result['video_info']
+        return dict(result, video_info={
+            'id': info.get('id'),
+            'title': info.get('title'),
+            'duration': info.get('duration'),
+        })
+
+    def fetch_metadata(self, url, output_path, subtitle_lang=None):
+        """Extract video info and get the subtitle file, without downloading media
+
+        The subtitle file is written into output_path, the job's workspace, and
+        moved into the media store when there is one.
+        """
+        import yt_dlp
+
+        ydl_opts = {
+            'outtmpl': os.path.join(output_path, '%(title)s-%(id)s.%(ext)s'),
+            'skip_download': True,
+            'writesubtitles': True,
+            'subtitleslangs': [subtitle_lang] if subtitle_lang else [],
+            'subtitlesformat': 'srt',
+        }
+
+        cache = self.info_cache
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = cache.get(url) if cache is not None else None
+                if info is not None:
+                    self.metrics.increment('info_cache_hits')
+                else:
+                    info = ydl.extract_info(url, download=False)
+                    if cache is not None:
+                        cache.put(url, info)
+                subtitle_path = None
+                if not subtitle_lang:
+                    return {'subtitle_path': None, 'video_info': info}
+
+                store = self.media_store
+                kind = f"subtitles.{subtitle_lang}"
+                if store is not None:
+                    subtitle_path = store.get(info['id'], VIDEO_FORMAT, kind)
+                    if subtitle_path:
+                        return {'subtitle_path': subtitle_path, 'video_info': info}
+
+                # Writes only the subtitle files because of skip_download
+                ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+                # Look for the subtitle file
+                subtitle_name = f"{os.path.splitext(ydl.prepare_filename(info))[0]}.{subtitle_lang}.srt"
+                if os.path.exists(subtitle_name):
+                    subtitle_path = subtitle_name
+                    if store is not None:
+                        subtitle_path = store.put(info['id'], VIDEO_FORMAT, kind, subtitle_name)
+
+                return {
+                    'subtitle_path': subtitle_path,
+                    'video_info': info
+                }
+        except Exception as e:
+            raise (JobInputError if ytdlp_input_error(e) else Exception)(f"Error loading video info: {str(e)}")
+
+    def download_media(self, url, output_path, info=None, section=None):
+        """Download and merge the video, or serve it from the media store
+
+        Reuses an already extracted info dict if given. With section=(start,
+        end) in seconds only that part is fetched, cut exactly at start.
+        """
+        import yt_dlp
+
+        store = self.media_store
+        if section:
+            cached = store.get(info['id'], VIDEO_FORMAT, 'video') if store and info and info.get('id') else None
+            if not cached:
+                try:
+                    return self.download_section(url, output_path, info, section)
+                except Exception as e:
+                    # Some formats cannot be fetched partially; take the whole video and cut it
+                    self.update_status(f"Downloading the whole video for the preview: {str(e)}")
+            result = self.download_media(url, output_path, info)
+            video_path = self.cut_section(result['video_path'], section, output_path, result['video_info']['id'])
+            return dict(result, video_path=video_path, audio_path=video_path)
+
+        if store is not None and info and info.get('id'):
+            video_path = store.get(info['id'], VIDEO_FORMAT, 'video')
+            if video_path:
+                return {'video_path': video_path, 'audio_path': video_path, 'video_info': info}
+
+        ydl_opts = {
+            'outtmpl': os.path.join(output_path, '%(title)s-%(id)s.%(ext)s'),
+            'format': VIDEO_FORMAT,
+            'merge_output_format': 'mp4',
+            'concurrent_fragment_downloads': self.fragment_downloads,
+            # Raising from a hook aborts the download
+            'progress_hooks': [lambda _: self.check_cancelled()],
+        }
+
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if info and info.get('formats'):
+                    # Same path as yt-dlp's --load-info-json: no second extraction
+                    info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                else:
+                    info = ydl.extract_info(url, download=True)
+                video_path = ydl.prepare_filename(info)
+        except Exception as e:
+            raise Exception(f"Error downloading video: {str(e)}")
+
+        if store is not None:
+            video_path = store.put(info['id'], VIDEO_FORMAT, 'video', video_path)
+
+        return {
+            'video_path': video_path,
+            'audio_path': video_path,  # Same as video path since we merge them
+            'video_info': info
+        }
+
+    def stored_audio(self, video_id):
+        """The stored video's original audio track, copied out of it on first use
+
+        None if the video is not in the media store or has no audio track.
+        Nothing in the dubbing itself needs the original audio, so it is only
+        extracted when asked for.
+        """
+        store = self.media_store
+        if store is None:
+            return None
+        audio_path = store.get(video_id, VIDEO_FORMAT, 'audio')
+        if audio_path:
+            return audio_path
+        video_path = store.get(video_id, VIDEO_FORMAT, 'video')
+        if not video_path:
+            return None
+
+        # Matroska takes whatever codec the track has, so the copy needs no re-encode
+        fd, extracted = tempfile.mkstemp(dir=os.path.dirname(video_path), suffix=".mka")
+        os.close(fd)
+        try:
+            subprocess.run([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-i', video_path, '-map', '0:a:0', '-c', 'copy',
+                extracted
+            ], check=True)
+            return store.put(video_id, VIDEO_FORMAT, 'audio', extracted)
+        except Exception as e:
+            self.update_status(f"Could not extract the audio track: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(extracted):
+                os.remove(extracted)
+
+    def download_section(self, url, directory, info, section):
+        """Download only start..end seconds of the video into the job's workspace with yt-dlp's download ranges"""
+        import yt_dlp
+        from yt_dlp.utils import download_range_func
+
+        ydl_opts = {
+            'outtmpl': os.path.join(directory, '%(title)s-%(id)s.%(section_start)s-%(section_end)s.%(ext)s'),
+            'format': VIDEO_FORMAT,
+            'merge_output_format': 'mp4',
+            'download_ranges': download_range_func(None, [tuple(section)]),
+            # Re-encodes around the cuts so the clip starts at start, not at the keyframe before it
+            'force_keyframes_at_cuts': True,
+            'progress_hooks': [lambda _: self.check_cancelled()],
+        }
+
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if info and info.get('formats'):
+                    info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                else:
+                    info = ydl.extract_info(url, download=True)
+        except Exception as e:
+            raise Exception(f"Error downloading video: {str(e)}")
+
+        video_path = info['requested_downloads'][0]['filepath']
+        return {'video_path': video_path, 'audio_path': video_path, 'video_info': info}
+
+    def cut_section(self, video_path, section, directory, video_id):
+        """Video of start..end seconds of a local file, re-encoded so it starts exactly at start
+
+        The clip only feeds the mux, so it goes into the job's workspace and
+        is deleted with it, never next to the output.
+        """
+        start, end = section
+        clip_path = os.path.join(directory, f"{video_id}.{start:g}-{end:g}.mp4")
+        try:
+            subprocess.run([
+                'ffmpeg', '-y', '-loglevel', 'error',
+                '-ss', str(start), '-i', video_path, '-t', str(end - start),
+                '-map', '0:v:0', '-preset', 'veryfast',
+                clip_path
+            ], check=True)
+        except Exception as e:
+            raise Exception(f"Error cutting the preview: {str(e)}")
+        return clip_path
+
+    def download_checkpointed(self, job, info=None, manifest=None, section=None, workspace=None):
+        """Download the media into the job's workspace unless a checkpointed copy still exists"""
+        result = manifest.stage('download') if manifest else None
+        if result and os.path.exists(result['video_path']):
+            return result
+
+        # Downloads have their own slots, so a job's translation is not held up
+        # by its own background download
+        with self.stage_slot('download'), self.metrics.span('download'):
+            result = self.download_media(job.url, workspace.directory, info, section=section)
+        self.metrics.add_bytes('media', os.path.getsize(result['video_path']))
+        # A file left in the workspace is deleted with it; only the media store's copies last
+        kept = os.path.dirname(os.path.abspath(result['video_path'])) != os.path.abspath(workspace.directory)
+        if manifest and kept:
+            manifest.complete_stage('download', self.info_checkpoint(result))
+        return result
+
+    def get_subtitles(self, job, downloaded_subtitle_path=None):
+        """Get subtitles from manual text, a given SRT file or the downloaded one"""
+        if job.subtitle_text and job.subtitle_text.strip():
+            return parse_subtitle_text(job.subtitle_text)
+
+        subtitle_path = job.subtitle_path or downloaded_subtitle_path
+        if subtitle_path:
+            return parse_subtitle_file(subtitle_path)
+
+        raise JobInputError("No subtitles available. Please either enter subtitles manually or ensure the video has subtitles.")
+
+    def normalize_subtitles(self, subtitle_info):
+        normalized = normalize_cues(subtitle_info, max_duration=self.max_cue_seconds)
+        self.metrics.increment('cues_parsed', len(subtitle_info))
+        self.metrics.increment('cues_normalized', len(normalized))
+        if len(normalized) != len(subtitle_info):
+            self.update_status(f"Subtitles: {len(subtitle_info)} cues merged into {len(normalized)}")
+        return normalized
+
+    def translate_texts(self, subtitle_info, source_lang, target_lang, progress_callback=None):
+        backend = self.translator_factory(source_lang, target_lang)
+        cache = self.translation_cache
+        stage = TranslationStage(backend, cache=cache,
+                                 source_lang=source_lang, target_lang=target_lang)
+
+        def report(done, total):
+            if progress_callback:
+                progress_callback(done / total)
+
+        try:
+            translated = stage.translate([text for _, _, text in subtitle_info], progress_callback=report)
+        except Exception as e:
+            raise Exception(f"Error translating subtitles: {str(e)}")
+
+        self.metrics.increment('translated_lines', len(translated))
+        if cache is not None:
+            stats = cache.stats()
+            self.update_status(f"Translation cache: {stats['hits']} hits, {stats['misses']} misses")
+        return translated
+
+    def cue_slots(self, subtitle_info, duration):
+        """(start, slot end) in seconds per cue
+
+        A segment may use the silence up to the next cue before being
+        compressed, so its slot ends where the next cue starts.
+        """
+        times = [(start.total_seconds(), end.total_seconds()) for start, end, _ in subtitle_info]
+        next_starts = [start for start, _ in times[1:]] + [duration]
+        return [(start, max(end, next_start)) for (start, end), next_start in zip(times, next_starts)]
+
+    def render_cues(self, subtitle_info, track_duration, translated_texts, placements):
+        """Per-cue entries of a RenderRecord track"""
+        return [[start, slot_end, text, translation, *extent]
+                for (start, slot_end), (_, _, text), translation, extent
+                in zip(self.cue_slots(subtitle_info, track_duration), subtitle_info,
+                       translated_texts, placements)]
+
+    def track_duration(self, subtitle_info, duration):
+        """Length of the dubbed track: the video's, or the last cue's end if later"""
+        return max([duration or 0] + [end.total_seconds() for _, end, _ in subtitle_info])
+
+    def synthesize_speech(self, translated_texts, subtitle_info, target_lang, mixer, manifest=None,
+                          after_place=None, workers=None, placements=None):
+        """Synthesize every translated line and mix it in at its cue time as it completes
+
+        With a manifest, each finished segment is checkpointed and segments
+        saved by an earlier attempt are reused instead of synthesized again.
+        A placements list receives the range of samples each cue's audio covers.
+        """
+        import numpy as np
+
+        cue_times = [(start.total_seconds(), end.total_seconds()) for start, end, _ in subtitle_info]
+        duration = mixer.duration
+        slots = self.cue_slots(subtitle_info, duration)
+        cache = self.audio_cache
+
+        # Audio before the earliest unfinished cue can no longer change
+        earliest_start = [duration] * (len(cue_times) + 1)
+        for i in range(len(cue_times) - 1, -1, -1):
+            earliest_start[i] = min(cue_times[i][0], earliest_start[i + 1])
+        finished = [False] * len(cue_times)
+        first_pending = 0
+
+        if manifest:
+            resumed = len(manifest.completed_segments(target_lang))
+            if resumed:
+                self.update_status(f"Resuming: {resumed}/{len(cue_times)} segments already synthesized")
+
+        def synthesize(index, text):
+            if not text.strip():
+                return np.zeros(0, dtype=np.float32)
+            try:
+                data = manifest.load_segment(index, target_lang) if manifest else None
+                if data is None:
+                    data = self.synthesize_segment(text, target_lang, cache)
+                    if manifest:
+                        manifest.save_segment(index, data, target_lang)
+                else:
+                    self.metrics.increment('segments_resumed')
+                with self.stage_slot('cpu'), self.metrics.span('decode'):
+                    samples = decode_audio(data, SAMPLE_RATE)
+            except Exception as e:
+                raise Exception(f"Error in speech generation: {str(e)}")
+            self.metrics.add_bytes('decoded_pcm', samples.nbytes)
+            return samples
+
+        def place(index, samples):
+            # Mixing writes through to the mux, so a failed ffmpeg surfaces here
+            try:
+                with self.metrics.span('mix_place'):
+                    extent = mixer.place(samples, *slots[index])
+            except Exception as e:
+                raise Exception(f"Error in audio processing: {str(e)}")
+            if placements is not None:
+                placements[index] = extent
+
+            if after_place:
+                # Raises the download's own error if it failed
+                after_place()
+
+            nonlocal first_pending
+            finished[index] = True
+            while first_pending < len(finished) and finished[first_pending]:
+                first_pending += 1
+            try:
+                with self.metrics.span('mix_flush'):
+                    mixer.flush_until(earliest_start[first_pending])
+            except Exception as e:
+                raise Exception(f"Error in audio processing: {str(e)}")
+
+        def report(done, total):
+            self.update_status(f"Converting text to speech [{target_lang}] ({done}/{total})...")
+            self.update_language_progress(target_lang, 1 / 3 + (2 / 3) * done / total)
+
+        # synthesize and place label their own errors, so a failed mux is not
+        # reported as a speech generation error
+        self.segment_synthesizer(synthesize, workers).run(
+            translated_texts, progress_callback=report, result_callback=place)
+
+        if cache is not None:
+            cache.evict()
+            stats = cache.stats()
+            self.update_status(f"Speech cache: {stats['hits']} hits, {stats['misses']} misses")
+
+    def segment_synthesizer(self, synthesize, workers=None):
+        return SegmentSynthesizer(
+            synthesize,
+            max_workers=workers or self.tts_workers,
+            retries=self.tts_retries,
+            pause_check=self.pause_check,
+            cancel_check=self.check_cancelled,
+        )
+
+    def synthesize_segment(self, text, target_lang, cache=None):
+        """Synthesize one line to encoded audio bytes; safe to call from worker threads"""
+        backend = self.tts_backend
+        cache_key = None
+        audio_data = None
+        if cache is not None:
+            cache_key = AudioCache.make_key(backend.name, backend.voice, target_lang, text, SAMPLE_RATE)
+            audio_data = cache.get(cache_key)
+
+        if audio_data is None:
+            # Generate speech straight into memory
+            with self.metrics.span('tts_request'):
+                audio_data = backend.synthesize(text, target_lang)
+            self.metrics.add_bytes('tts_audio', len(audio_data))
+            if cache_key is not None:
+                cache.put(cache_key, audio_data)
+
+        return audio_data
+
+    def mux(self, video_path, audio_tracks, output_video):
+        """Merge video with dubbed audio; audio_tracks is a list of (lang, path)"""
+        inputs = []
+        for _, audio_path in audio_tracks:
+            inputs += ['-i', audio_path]
+        subprocess.run([
+            'ffmpeg', '-y',
+            '-i', video_path,
+            *inputs,
+            *audio_track_args([lang for lang, _ in audio_tracks]),
+            '-c:v', 'copy',
+            '-c:a', 'aac',
+            output_video
+        ], check=True)
@@ -0,0 +1,301 @@
+import random
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised without contacting a backend that has been failing
+
+    remaining is how many seconds the circuit stays open; 0 while another
+    caller's trial call decides whether it closes.
+    """
+
+    def __init__(self, message, remaining=0.0):
+        super().__init__(message)
+        self.remaining = remaining
+
+
+class TokenBucket:
+    """Allows rate requests per second on average, with bursts of up to burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+
+class AdaptiveLimiter:
+    """Concurrency and request rate that adapt to throttling (AIMD)
+
+    Successes raise the concurrency limit by about one slot per round of
+    requests and the rate by about a twentieth of its ceiling per second. A
+    throttled request halves both, at most once per cooldown so a burst of
+    429s from requests that were already in flight counts as one signal.
+    """
+
+    def __init__(self, rate, max_concurrency, burst=None, min_rate=0.2, decrease=0.5, cooldown=1.0):
+        self.max_rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.max_concurrency = max_concurrency
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.bucket = TokenBucket(rate, burst)
+        self.limit = float(max_concurrency)
+        self.active = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.active >= int(self.limit):
+                self._condition.wait()
+            self.active += 1
+        self.bucket.acquire()
+
+    def release(self):
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+            rate = min(self.max_rate, self.bucket.rate + self.max_rate / 20 / self.bucket.rate)
+            self._condition.notify_all()
+        self.bucket.set_rate(rate)
+
+    def on_throttle(self):
+        now = time.monotonic()
+        with self._condition:
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self.limit = max(1.0, self.limit * self.decrease)
+            rate = max(self.min_rate, self.bucket.rate * self.decrease)
+        self.bucket.set_rate(rate)
+
+
+class CircuitBreaker:
+    """Fails calls fast after failure_threshold consecutive failures
+
+    After reset_timeout one trial call is let through; its success closes
+    the circuit again and its failure keeps it open for another timeout.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = None  # when the current trial call started
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self, name):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            remaining = self.opened_at + self.reset_timeout - now
+            # A trial that never reported back (its caller was interrupted) is replaced
+            if remaining <= 0 and (self._trial is None or now - self._trial >= self.reset_timeout):
+                self._trial = now
+                return
+        remaining = max(0.0, remaining)
+        raise CircuitOpenError(f"{name} is failing; not retrying for {remaining:.0f}s", remaining)
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = None
+
+    def on_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = None
+
+
+def status_code(error):
+    """HTTP status behind an exception from requests, gTTS, deep_translator or urllib, if any"""
+    for attribute in ('response', 'rsp'):
+        response = getattr(error, attribute, None)
+        code = getattr(response, 'status_code', None)
+        if code is not None:
+            return code
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code
+    if type(error).__name__ == 'TooManyRequests':
+        return 429
+    return None
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it said"""
+    # A requests Response for a 4xx or 5xx status is falsy, so test for None
+    response = getattr(error, 'response', None)
+    if response is None:
+        response = getattr(error, 'rsp', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        headers = getattr(error, 'headers', None)
+    try:
+        return float(headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def classify(error):
+    """'throttled', 'transient' (worth retrying) or 'fatal'"""
+    code = status_code(error)
+    if code == 429:
+        return 'throttled'
+    if code is not None:
+        return 'transient' if code >= 500 or code == 408 else 'fatal'
+    # requests' exceptions are OSErrors; gTTS and deep_translator wrap failed
+    # connections in their own types
+    if isinstance(error, OSError) or type(error).__name__ in ('gTTSError', 'RequestError'):
+        return 'transient'
+    return 'fatal'
+
+
+class BackendClient:
+    """Rate limiting, AIMD concurrency, jittered retries and a circuit breaker around one backend
+
+    Share one client between everything that calls the same service in a
+    process, so that all jobs and languages slow down together when it
+    starts throttling. Retries use full jitter between base_delay and an
+    exponentially growing cap, or the server's Retry-After when it sends
+    one, and hold neither a concurrency slot nor a token while sleeping.
+    A call that finds the circuit open waits for it to half-open as one of
+    its retries, so a short outage does not fail every call in flight.
+    """
+
+    def __init__(self, name, rate=5.0, max_concurrency=4, burst=None, retries=5,
+                 base_delay=0.5, max_delay=30.0, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.limiter = AdaptiveLimiter(rate, max_concurrency, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.counters = {'requests': 0, 'throttled': 0, 'retried': 0, 'failed': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def backoff(self, attempt, error):
+        delay = retry_after(error)
+        if delay is None:
+            cap = min(self.max_delay, self.base_delay * 2 ** attempt)
+            delay = random.uniform(self.base_delay, max(self.base_delay, cap))
+        return min(delay, self.max_delay)
+
+    def call(self, fn, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call(self.name)
+            except CircuitOpenError as e:
+                if e.remaining and attempt >= self.retries:
+                    self._count('failed')
+                    raise
+                if e.remaining:
+                    self._count('retried')
+                    attempt += 1
+                # Waiting for another caller's trial call costs no attempt
+                time.sleep(e.remaining or self.base_delay)
+                continue
+            self.limiter.acquire()
+            self._count('requests')
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                kind = classify(e)
+                if kind == 'transient':
+                    self.breaker.on_failure()
+                else:
+                    # The service answered, so it is up even if it refused
+                    self.breaker.on_success()
+                if kind == 'throttled':
+                    self._count('throttled')
+                    self.limiter.on_throttle()
+                if kind == 'fatal' or attempt >= self.retries:
+                    self._count('failed')
+                    raise
+                error = e
+            else:
+                self.limiter.on_success()
+                self.breaker.on_success()
+                return result
+            finally:
+                self.limiter.release()
+
+            self._count('retried')
+            time.sleep(self.backoff(attempt, error))
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, rate=self.limiter.bucket.rate,
+                        concurrency=int(self.limiter.limit), circuit=self.breaker.state)
+
+
+# Conservative defaults for the free Google endpoints
+DEFAULT_LIMITS = {
+    'gtts': {'rate': 10.0, 'max_concurrency': 8},
+    'google_translate': {'rate': 5.0, 'max_concurrency': 4},
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def shared_client(name, **options):
+    """The process-wide client for a backend; options only apply to the call that creates it"""
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = BackendClient(name, **dict(DEFAULT_LIMITS.get(name, {}), **options))
+        return _clients[name]
+
+
+def client_counters():
+    """Counters of every shared client, by backend name"""
+    with _clients_lock:
+        clients = list(_clients.values())
+    return {client.name: client.stats() for client in clients}
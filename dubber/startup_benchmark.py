@@ -0,0 +1,90 @@
+"""Startup time of the GUI and of headless workers, checked against budgets
+
+    python -m dubber.startup_benchmark
+    python -m dubber.startup_benchmark --gui-budget 0.5 --worker-budget 0.3
+
+Exits 1 if a median start time is over its budget or if a heavy backend is
+imported before any stage needs it.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Backends that must only load when their stage first runs
+HEAVY_MODULES = ['yt_dlp', 'numpy', 'soundfile', 'gtts', 'deep_translator', 'PIL', 'requests',
+                 'langdetect', 'arabic_reshaper', 'bidi', 'torch', 'TTS']
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORKER_CODE = "import dubber.cli"
+GUI_CODE = "import main"
+# With a display, include building the window
+GUI_WINDOW_CODE = ("import tkinter as tk, main\n"
+                   "root = tk.Tk(); main.DubbingApp(root); root.update(); root.destroy()")
+CHECK_CODE = "{code}\nimport sys; print(','.join(m for m in {modules!r} if m in sys.modules))"
+
+
+def time_python(code, runs):
+    """Median wall time of a fresh interpreter running code"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=REPO_DIR, check=True,
+                       stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def eager_heavy_imports(code):
+    result = subprocess.run(
+        [sys.executable, '-c', CHECK_CODE.format(code=code, modules=HEAVY_MODULES)],
+        cwd=REPO_DIR, check=True, capture_output=True, text=True)
+    return [name for name in result.stdout.strip().split(',') if name]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m dubber.startup_benchmark",
+        description="Measure GUI launch and headless worker start times")
+    parser.add_argument("--runs", type=int, default=5, help="runs per measurement (default: 5)")
+    parser.add_argument("--gui-budget", type=float, default=0.6,
+                        help="allowed median GUI start time in seconds (default: 0.6)")
+    parser.add_argument("--worker-budget", type=float, default=0.3,
+                        help="allowed median worker start time in seconds (default: 0.3)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    gui_code = GUI_WINDOW_CODE if os.environ.get("DISPLAY") else GUI_CODE
+
+    interpreter = time_python("pass", args.runs)
+    cases = [
+        ("worker", WORKER_CODE, args.worker_budget),
+        ("gui" if gui_code is GUI_WINDOW_CODE else "gui (import only, no display)",
+         gui_code, args.gui_budget),
+    ]
+
+    failures = []
+    print(f"{'':<32} {'median s':>9} {'budget s':>9}")
+    print(f"{'bare interpreter':<32} {interpreter:>9.3f}")
+    for name, code, budget in cases:
+        seconds = time_python(code, args.runs)
+        print(f"{name:<32} {seconds:>9.3f} {budget:>9.3f}")
+        if seconds > budget:
+            failures.append(f"{name} took {seconds:.3f}s, budget {budget:.3f}s")
+        heavy = eager_heavy_imports(code if code is not GUI_WINDOW_CODE else GUI_CODE)
+        if heavy:
+            failures.append(f"{name} imports {', '.join(heavy)} at startup")
+
+    for message in failures:
+        print(f"Over budget: {message}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""Local HTTP stand-in for the translation and TTS services, with throttling and latency
+
+    python -m dubber.stub_server --rate 20 --latency 0.05 --requests 500
+    python -m dubber.stub_server --rate 20 --failure-rate 0.05 --threads 32
+    python -m dubber.stub_server --check
+
+Sends the same load through a BackendClient and through plain fixed
+retries, and reports throughput, 429s and retries for both. --check
+instead verifies that the client honours Retry-After and that its
+circuit breaker opens and half-opens, and exits 1 if not.
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .ratelimit import BackendClient, CircuitOpenError, TokenBucket, retry_after
+from .tts import StubTTS
+
+
+class StubServer:
+    """Serves /translate and /tts on localhost, answering 429 once over rate
+
+    Requests over the server's own token bucket get a 429 with Retry-After,
+    a failure_rate fraction of the others get a 503, and every response is
+    delayed by latency seconds.
+    """
+
+    def __init__(self, rate=20.0, burst=None, latency=0.05, failure_rate=0.0, retry_after=None):
+        self.bucket = TokenBucket(rate, burst)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.retry_after = retry_after
+        self.tts = StubTTS()
+        self.counts = {'ok': 0, 'throttled': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                request = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(request.query).items()}
+                time.sleep(stub.latency)
+                status, headers, body = stub.respond(request.path, query)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _take_token(self):
+        with self.bucket._lock:
+            self.bucket._refill(time.monotonic())
+            if self.bucket.tokens < 1:
+                return False
+            self.bucket.tokens -= 1
+            return True
+
+    def respond(self, path, query):
+        if not self._take_token():
+            self._count('throttled')
+            headers = {'Retry-After': str(self.retry_after)} if self.retry_after else {}
+            return 429, headers, b"Too Many Requests"
+        if random.random() < self.failure_rate:
+            self._count('failed')
+            return 503, {}, b"Service Unavailable"
+        self._count('ok')
+        text = query.get('q', "")
+        if path == '/tts':
+            return 200, {'Content-Type': 'audio/wav'}, self.tts.synthesize(text, query.get('tl', 'ar'))
+        body = json.dumps({'translation': f"[{query.get('tl', 'ar')}] {text}"}, ensure_ascii=False)
+        return 200, {'Content-Type': 'application/json'}, body.encode('utf-8')
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class HTTPTranslator:
+    """Translator backend for a StubServer; one request per line"""
+
+    def __init__(self, base_url, source_lang=None, target_lang="ar", client=None, session=None):
+        import requests
+
+        self.base_url = base_url
+        self.target_lang = target_lang
+        self.client = client
+        self.session = session or requests.Session()
+
+    def translate(self, text):
+        response = self.session.get(f"{self.base_url}/translate",
+                                    params={'q': text, 'tl': self.target_lang}, timeout=10)
+        response.raise_for_status()
+        return response.json()['translation']
+
+    def translate_batch(self, texts):
+        if self.client:
+            return [self.client.call(self.translate, text) for text in texts]
+        return [self.translate(text) for text in texts]
+
+
+class HTTPTTS:
+    """TTS backend for a StubServer; returns WAV bytes"""
+
+    name = "stub_http"
+    voice = None
+
+    def __init__(self, base_url, client=None, session=None):
+        import requests
+
+        self.base_url = base_url
+        self.client = client
+        self.session = session or requests.Session()
+
+    def request(self, text, lang):
+        response = self.session.get(f"{self.base_url}/tts", params={'q': text, 'tl': lang}, timeout=10)
+        response.raise_for_status()
+        return response.content
+
+    def synthesize(self, text, lang):
+        if self.client:
+            return self.client.call(self.request, text, lang)
+        return self.request(text, lang)
+
+
+def fixed_retries(fn, retries=5, delay=1.0):
+    """What the pipeline did before BackendClient: retry any error after a fixed, growing delay"""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt >= retries:
+                raise
+            time.sleep(delay * 2 ** attempt)
+
+
+def run_load(server, call, requests_count, threads):
+    """Send requests_count TTS requests from threads threads; returns the measurements"""
+    server.counts = dict.fromkeys(server.counts, 0)
+    failures = 0
+
+    def one(i):
+        nonlocal failures
+        try:
+            call(f"line {i}")
+        except Exception:
+            failures += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(requests_count)))
+    wall = time.perf_counter() - start
+    return dict(server.counts, wall=wall, per_second=(requests_count - failures) / wall,
+                gave_up=failures)
+
+
+def check_client():
+    """Problems found running a BackendClient against stub servers; empty if it behaves"""
+    problems = []
+
+    # One request per 2 s: the second request gets a 429 with Retry-After
+    server = StubServer(rate=0.5, burst=1, latency=0, retry_after=0.25).start()
+    try:
+        tts = HTTPTTS(server.url)
+        tts.synthesize("first", "ar")
+        try:
+            tts.synthesize("second", "ar")
+            problems.append("the stub server did not throttle")
+        except Exception as e:
+            client = BackendClient("check", base_delay=5.0)
+            if retry_after(e) != 0.25:
+                problems.append(f"Retry-After read as {retry_after(e)}, expected 0.25")
+            elif client.backoff(0, e) != 0.25:
+                problems.append(f"backoff is {client.backoff(0, e)}s, ignoring Retry-After 0.25")
+    finally:
+        server.stop()
+
+    # Every request fails with a 503 until the server recovers
+    server = StubServer(rate=1000, latency=0, failure_rate=1.0).start()
+    try:
+        client = BackendClient("check", rate=1000, retries=0, failure_threshold=3, reset_timeout=0.5)
+        tts = HTTPTTS(server.url, client)
+        for _ in range(3):
+            try:
+                tts.synthesize("line", "ar")
+            except CircuitOpenError:
+                problems.append("the circuit opened before failure_threshold failures")
+            except Exception:
+                pass
+        sent = server.counts['failed']
+        try:
+            tts.synthesize("line", "ar")
+            problems.append("a call went through while the circuit should be open")
+        except CircuitOpenError:
+            pass
+        except Exception:
+            problems.append("the circuit did not open after failure_threshold failures")
+        if server.counts['failed'] != sent:
+            problems.append("the open circuit still contacted the server")
+
+        time.sleep(0.6)
+        if client.breaker.state != 'half-open':
+            problems.append(f"the circuit is {client.breaker.state} after reset_timeout, not half-open")
+        server.failure_rate = 0.0
+        try:
+            tts.synthesize("line", "ar")
+        except Exception as e:
+            problems.append(f"the trial call after reset_timeout failed: {e}")
+        if client.breaker.state != 'closed':
+            problems.append(f"the circuit is {client.breaker.state} after a successful trial, not closed")
+    finally:
+        server.stop()
+    return problems
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m dubber.stub_server",
+        description="Compare adaptive rate limiting with fixed retries against a throttling stub server")
+    parser.add_argument("--rate", type=float, default=20, help="requests/s the server accepts (default: 20)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response (default: 0.05)")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="fraction of accepted requests answered with 503")
+    parser.add_argument("--retry-after", type=float, default=None,
+                        help="Retry-After the server sends with 429s (default: none)")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--client-rate", type=float, default=50,
+                        help="rate ceiling of the BackendClient (default: 50, above the server's)")
+    parser.add_argument("--check", action="store_true",
+                        help="check Retry-After handling and the circuit breaker instead, exit 1 on failure")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.check:
+        problems = check_client()
+        for problem in problems:
+            print(f"Failed: {problem}")
+        if not problems:
+            print("BackendClient honours Retry-After and its circuit breaker opens, half-opens and closes")
+        return 1 if problems else 0
+
+    server = StubServer(args.rate, latency=args.latency, failure_rate=args.failure_rate,
+                        retry_after=args.retry_after).start()
+    try:
+        adaptive = HTTPTTS(server.url, BackendClient("stub", rate=args.client_rate,
+                                                     max_concurrency=args.threads))
+        naive = HTTPTTS(server.url)
+        results = [
+            ("fixed retries", run_load(server, lambda text: fixed_retries(
+                lambda: naive.synthesize(text, "ar")), args.requests, args.threads)),
+            ("backend client", run_load(server, lambda text: adaptive.synthesize(text, "ar"),
+                                        args.requests, args.threads)),
+        ]
+    finally:
+        server.stop()
+
+    print(f"{'':<16} {'ok/s':>8} {'wall s':>8} {'429s':>6} {'503s':>6} {'gave up':>8}")
+    for name, result in results:
+        print(f"{name:<16} {result['per_second']:>8.1f} {result['wall']:>8.2f} "
+              f"{result['throttled']:>6} {result['failed']:>6} {result['gave_up']:>8}")
+    stats = adaptive.client.stats()
+    print(f"client settled at {stats['rate']:.1f} req/s, concurrency {stats['concurrency']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import re
+from datetime import timedelta
+
+import srt
+
+# Roughly how fast TTS voices speak, used where cues carry no timing of their own
+CHARS_PER_SECOND = 15
+
+SENTENCE_END = re.compile(r'[.!?؟。…]["\')\]]*$')
+SENTENCE_BREAK = re.compile(r'(?<=[.!?؟。…])\s+')
+CLAUSE_BREAK = re.compile(r'(?<=[,;:،؛])\s+')
+MARKUP = re.compile(r'<[^>]+>|\{\\[^}]*\}')
+
+
+def estimated_duration(text, min_seconds=1.5):
+    return max(min_seconds, len(text) / CHARS_PER_SECOND)
+
+
+def parse_subtitle_text(subtitle_text):
+    """Parse subtitle text to create SRT-like structure"""
+    # The text box also holds whole SRT files loaded with "Load Subtitle File";
+    # keep their timings so an edited line only moves that line
+    if '-->' in subtitle_text:
+        try:
+            return [(sub.start, sub.end, sub.content) for sub in srt.parse(subtitle_text)]
+        except srt.SRTParseError:
+            pass  # not SRT after all: treat it as plain lines
+
+    try:
+        # Split text into lines
+        lines = subtitle_text.strip().split('\n')
+        subtitles = []
+        current_time = 0
+
+        for line in lines:
+            if line.strip():  # Skip empty lines
+                # Create artificial timing long enough to speak the line
+                duration = estimated_duration(line.strip())
+                start_time = timedelta(seconds=current_time)
+                end_time = timedelta(seconds=current_time + duration)
+                subtitles.append((start_time, end_time, line.strip()))
+                current_time += duration
+
+        return subtitles
+    except Exception as e:
+        raise Exception(f"Error parsing manual subtitles: {str(e)}")
+
+
+def parse_timestamp(value):
+    """Seconds from a number of seconds, "m:ss" or "h:mm:ss"; fractions are allowed"""
+    seconds = 0.0
+    for part in str(value).strip().split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def cues_in_range(subtitle_info, start, end):
+    """Cues overlapping start..end seconds, moved so start is 0, and the range they need
+
+    The range is widened to take in whole cues, so a preview never cuts a
+    line off half way.
+    """
+    selected = [cue for cue in subtitle_info
+                if cue[1].total_seconds() > start and cue[0].total_seconds() < end]
+    if selected:
+        start = min([start] + [cue_start.total_seconds() for cue_start, _, _ in selected])
+        end = max([end] + [cue_end.total_seconds() for _, cue_end, _ in selected])
+    offset = timedelta(seconds=start)
+    return [(cue_start - offset, cue_end - offset, text) for cue_start, cue_end, text in selected], start, end
+
+
+def parse_subtitle_file(subtitle_path):
+    """Parse SRT file into list of (start, end, text) tuples"""
+    try:
+        with open(subtitle_path, 'r', encoding='utf-8') as f:
+            subtitle_content = f.read()
+
+        parsed = list(srt.parse(subtitle_content))
+        return [(sub.start, sub.end, sub.content) for sub in parsed]
+    except Exception as e:
+        raise Exception(f"Error parsing subtitle file: {str(e)}")
+
+
+def _words(text):
+    """Lowercase words without punctuation, for comparing rolling captions"""
+    return [re.sub(r'\W+', '', word) for word in text.lower().split()]
+
+
+def _strip_repeated_prefix(previous_lines, text, min_words=3):
+    """Drop the start of text that repeats the previous cue, as rolling captions do
+
+    Only a repeat of the whole previous cue or of its last line, or a run
+    of at least min_words words, counts: back to back cues often share a
+    word at the boundary ("We have to go." / "Go where?") that is dialogue.
+    """
+    words = text.split()
+    current = _words(text)
+    for candidate in (" ".join(previous_lines), previous_lines[-1]):
+        repeated = _words(candidate)
+        if len(repeated) >= 2 and current[:len(repeated)] == repeated:
+            return " ".join(words[len(repeated):])
+
+    before = _words(" ".join(previous_lines))[-30:]
+    for size in range(min(len(before), len(current)), min_words - 1, -1):
+        if before[-size:] == current[:size]:
+            return " ".join(words[size:])
+    return text
+
+
+def _split_text(text, max_chars):
+    """Split text into pieces of at most max_chars, at sentence, then clause, then word breaks"""
+    if len(text) <= max_chars:
+        return [text]
+    for pattern in (SENTENCE_BREAK, CLAUSE_BREAK, re.compile(r'\s+')):
+        parts = pattern.split(text)
+        if len(parts) > 1:
+            break
+    else:
+        return [text]  # one long word
+
+    pieces = []
+    current = ""
+    for part in parts:
+        if current and len(current) + 1 + len(part) > max_chars:
+            pieces.append(current)
+            current = part
+        else:
+            current = f"{current} {part}" if current else part
+    pieces.append(current)
+    return [piece for part in pieces for piece in _split_text(part, max_chars)]
+
+
+def normalize_cues(subtitle_info, max_duration=8.0, max_chars=200, max_gap=0.6, min_duration=1.0):
+    """Clean up cues before translation so each TTS call speaks a sentence-sized unit
+
+    Rolling auto-captions, where each cue repeats the words of the one
+    before it, are reduced to the new words. Adjacent cues are merged while
+    they are no more than max_gap seconds apart and the result stays within
+    max_duration and max_chars, stopping at the end of a sentence unless the
+    unit is still shorter than min_duration. Cues longer than that are split
+    at sentence, clause or word breaks, with time shared by length.
+    """
+    cues = []
+    previous_lines = None
+    for start, end, text in sorted(subtitle_info, key=lambda cue: cue[0]):
+        start, end = start.total_seconds(), end.total_seconds()
+        lines = [" ".join(line.split()) for line in MARKUP.sub('', text).splitlines() if line.strip()]
+        if not lines:
+            continue
+        text = " ".join(lines)
+        # Rolling captions repeat the previous cue as shown, not as already stripped
+        shown, previous_lines = previous_lines, lines
+        if cues and start - cues[-1][1] <= 0.1:
+            # Contiguous cue: possibly a rolling caption repeating the previous one
+            text = _strip_repeated_prefix(shown, text)
+            if not text:
+                cues[-1][1] = max(cues[-1][1], end)
+                continue
+        if cues and start < cues[-1][1]:
+            cues[-1][1] = start  # overlapping cues would be spoken over each other
+        cues.append([start, max(end, start), text])
+
+    merged = []
+    for start, end, text in cues:
+        if merged:
+            last = merged[-1]
+            fits = (start - last[1] <= max_gap
+                    and end - last[0] <= max_duration
+                    and len(last[2]) + 1 + len(text) <= max_chars)
+            open_sentence = not SENTENCE_END.search(last[2]) or last[1] - last[0] < min_duration
+            if fits and open_sentence:
+                last[1] = end
+                last[2] = f"{last[2]} {text}"
+                continue
+        merged.append([start, end, text])
+
+    normalized = []
+    for start, end, text in merged:
+        pieces = [text]
+        if end - start > max_duration or len(text) > max_chars:
+            count = max(int(-(-(end - start) // max_duration)), 1)
+            # Slow speech with few words is not worth splitting into fragments
+            pieces = _split_text(text, min(max_chars, max(40, len(text) // count + 1)))
+        total_chars = sum(len(piece) for piece in pieces)
+        position = start
+        for piece in pieces:
+            piece_end = position + (end - start) * len(piece) / total_chars
+            normalized.append((timedelta(seconds=position), timedelta(seconds=piece_end), piece))
+            position = piece_end
+    return normalized
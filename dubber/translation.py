@@ -0,0 +1,108 @@
+import time
+
+from .ratelimit import shared_client
+
+
+def normalize_text(text):
+    """Collapse whitespace so identical lines share one translation"""
+    return " ".join((text or "").split())
+
+
+class GoogleTranslateBackend:
+    """GoogleTranslator that sends several lines per request, joined by a delimiter
+
+    Requests are paced and retried by a BackendClient shared by every
+    translator in the process.
+    """
+
+    def __init__(self, source_lang, target_lang, delimiter="\n", client=None):
+        from deep_translator import GoogleTranslator
+
+        self.translator = GoogleTranslator(source=source_lang or 'auto', target=target_lang)
+        self.delimiter = delimiter
+        self.client = client or shared_client('google_translate')
+
+    def translate(self, text):
+        return self.client.call(self.translator.translate, text) or ""
+
+    def translate_batch(self, texts):
+        if len(texts) == 1:
+            return [self.translate(texts[0])]
+
+        translated = self.translate(self.delimiter.join(texts))
+        parts = [part.strip() for part in translated.split(self.delimiter)]
+        if len(parts) == len(texts):
+            return parts
+
+        # The service merged or split lines; fall back to one request per line
+        return [self.translate(text) for text in texts]
+
+
+class StubTranslator:
+    """Offline translator for benchmarks: tags each line and sleeps per request"""
+
+    def __init__(self, source_lang=None, target_lang="ar", latency=0.0):
+        self.target_lang = target_lang
+        self.latency = latency
+        self.requests = 0
+
+    def translate_batch(self, texts):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [f"[{self.target_lang}] {text}" for text in texts]
+
+
+class TranslationStage:
+    """Dedupes cue texts, packs them into size-limited batches and maps results back"""
+
+    def __init__(self, backend, max_batch_chars=4500, max_batch_size=100,
+                 cache=None, source_lang=None, target_lang=None):
+        self.backend = backend
+        self.max_batch_chars = max_batch_chars
+        self.max_batch_size = max_batch_size
+        self.cache = cache
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+
+    def make_batches(self, texts):
+        batches = []
+        current = []
+        current_chars = 0
+        for text in texts:
+            # +1 accounts for the delimiter the backend joins lines with
+            size = len(text) + 1
+            if current and (current_chars + size > self.max_batch_chars
+                            or len(current) >= self.max_batch_size):
+                batches.append(current)
+                current = []
+                current_chars = 0
+            current.append(text)
+            current_chars += size
+        if current:
+            batches.append(current)
+        return batches
+
+    def translate(self, texts, progress_callback=None):
+        """Translate texts and return one result per input, in input order"""
+        normalized = [normalize_text(text) for text in texts]
+        unique = [text for text in dict.fromkeys(normalized) if text]
+
+        translations = {"": ""}
+        if self.cache is not None and unique:
+            translations.update(self.cache.get_many(self.source_lang, self.target_lang, unique))
+            unique = [text for text in unique if text not in translations]
+
+        batches = self.make_batches(unique)
+        for i, batch in enumerate(batches, 1):
+            results = self.backend.translate_batch(batch)
+            if len(results) != len(batch):
+                raise Exception(f"Translator returned {len(results)} lines for a batch of {len(batch)}")
+            translations.update(zip(batch, results))
+            # Store per batch so an interrupted job keeps what it already paid for
+            if self.cache is not None:
+                self.cache.put_many(self.source_lang, self.target_lang, dict(zip(batch, results)))
+            if progress_callback:
+                progress_callback(i, len(batches))
+
+        return [translations[text] for text in normalized]
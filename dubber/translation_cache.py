@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .translation import normalize_text
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK = 400
+
+
+class TranslationCache:
+    """On-disk translation memory keyed by (source_lang, target_lang, normalized text)
+
+    Safe to share between threads and worker processes: every call opens its
+    own connection, the database runs in WAL mode and writers take the lock
+    up front. Least recently used entries are evicted past max_entries.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS translations (
+                    source_lang TEXT NOT NULL,
+                    target_lang TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (source_lang, target_lang, text)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("PRAGMA busy_timeout=30000")
+            yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, source_lang, target_lang, texts):
+        """Return {text: translation} for every text found in the cache"""
+        source_lang = source_lang or 'auto'
+        keys = list(dict.fromkeys(normalize_text(text) for text in texts))
+        found = {}
+        now = time.time()
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for start in range(0, len(keys), _CHUNK):
+                    chunk = keys[start:start + _CHUNK]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows = conn.execute(
+                        f"SELECT text, translation FROM translations "
+                        f"WHERE source_lang = ? AND target_lang = ? AND text IN ({placeholders})",
+                        [source_lang, target_lang] + chunk).fetchall()
+                    found.update(rows)
+                    conn.execute(
+                        f"UPDATE translations SET last_used = ? "
+                        f"WHERE source_lang = ? AND target_lang = ? AND text IN ({placeholders})",
+                        [now, source_lang, target_lang] + chunk)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, source_lang, target_lang, translations):
+        """Store {text: translation} pairs and evict old entries if over budget"""
+        source_lang = source_lang or 'auto'
+        now = time.time()
+        rows = [(source_lang, target_lang, normalize_text(text), translation, now)
+                for text, translation in translations.items() if translation is not None]
+        if not rows:
+            return
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO translations "
+                    "(source_lang, target_lang, text, translation, last_used) VALUES (?, ?, ?, ?, ?)",
+                    rows)
+                count = conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(
+                        "DELETE FROM translations WHERE rowid IN "
+                        "(SELECT rowid FROM translations ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
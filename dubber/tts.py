@@ -0,0 +1,140 @@
+import hashlib
+import io
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .ratelimit import shared_client
+
+
+class GTTSBackend:
+    """Google Text-to-Speech; returns MP3 bytes
+
+    Requests go through a BackendClient, shared by default with every other
+    gTTS user in the process, which paces them and retries throttled ones.
+    """
+
+    name = "gtts"
+    voice = None
+
+    def __init__(self, client=None):
+        self.client = client or shared_client(self.name)
+
+    def synthesize(self, text, lang):
+        from gtts import gTTS
+
+        def request():
+            buffer = io.BytesIO()
+            gTTS(text=text, lang=lang, slow=False).write_to_fp(buffer)
+            return buffer.getvalue()
+
+        return self.client.call(request)
+
+
+class StubTTS:
+    """Offline TTS for benchmarks: a deterministic tone per text, after a fixed latency
+
+    The tone lasts seconds_per_char per character and is returned as WAV
+    at gTTS's 24 kHz, so decoding and resampling cost the same as for real
+    speech.
+    """
+
+    name = "stub"
+    voice = None
+
+    def __init__(self, latency=0.0, seconds_per_char=0.06, sample_rate=24000):
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+        self.sample_rate = sample_rate
+        self.requests = 0
+
+    def synthesize(self, text, lang):
+        import numpy as np
+        import soundfile as sf
+
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        seed = int(hashlib.sha1(f"{lang}:{text}".encode('utf-8')).hexdigest()[:8], 16)
+        frequency = 200 + seed % 400
+        length = max(1, int(len(text) * self.seconds_per_char * self.sample_rate))
+        tone = 0.3 * np.sin(2 * np.pi * frequency * np.arange(length) / self.sample_rate)
+        buffer = io.BytesIO()
+        sf.write(buffer, tone.astype(np.float32), self.sample_rate, format='WAV', subtype='PCM_16')
+        return buffer.getvalue()
+
+
+class SegmentSynthesizer:
+    """Bounded thread pool that synthesizes segments and returns them in cue order
+
+    At most max_pending segments are queued or finished but not yet handed
+    over, so a slow consumer holds back synthesis instead of letting decoded
+    audio pile up in memory.
+    """
+
+    def __init__(self, synthesize_fn, max_workers=4, retries=2, retry_delay=1.0, pause_check=None,
+                 max_pending=None, cancel_check=None):
+        self.synthesize_fn = synthesize_fn
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending or self.max_workers * 4
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.pause_check = pause_check
+        # Raises to stop the run, e.g. pipeline.check_cancelled
+        self.cancel_check = cancel_check
+
+    def wait_if_paused(self):
+        while self.pause_check and self.pause_check():
+            time.sleep(0.1)
+
+    def _synthesize_with_retry(self, index, text):
+        attempt = 0
+        while True:
+            # Paused jobs stop picking up new segments; running ones finish
+            self.wait_if_paused()
+            if self.cancel_check:
+                self.cancel_check()
+            try:
+                return self.synthesize_fn(index, text)
+            except Exception:
+                if attempt >= self.retries:
+                    raise
+                attempt += 1
+                time.sleep(self.retry_delay * (2 ** (attempt - 1)))
+
+    def run(self, texts, progress_callback=None, result_callback=None):
+        """Synthesize every text and call progress_callback(done, total) per finished segment
+
+        With result_callback(index, result) each result is handed over as soon
+        as it is ready instead of being kept in the returned list.
+        """
+        results = [None] * len(texts)
+        total = len(texts)
+        completed = 0
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = {}
+        queued = iter(enumerate(texts))
+        try:
+            while True:
+                for i, text in queued:
+                    pending[executor.submit(self._synthesize_with_retry, i, text)] = i
+                    if len(pending) >= self.max_pending:
+                        break
+                if not pending:
+                    break
+
+                # Callbacks run on the calling thread, never on the pool threads
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = pending.pop(future)
+                    if result_callback:
+                        result_callback(index, future.result())
+                    else:
+                        results[index] = future.result()
+                    completed += 1
+                    if progress_callback:
+                        progress_callback(completed, total)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        return results
@@ -0,0 +1,202 @@
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from .media_store import fingerprint
+
+DEFAULT_MODEL = "tts_models/multilingual/multi-dataset/xtts_v2"
+
+# XTTS spells a few languages differently from Google
+MODEL_LANGUAGES = {'zh-CN': 'zh-cn', 'zh-TW': 'zh-cn'}
+
+
+class _ModelRunner:
+    """The loaded model and the speaker conditioning computed for it; lives in the worker"""
+
+    def __init__(self, model_name, device):
+        import torch
+        from TTS.api import TTS
+
+        torch.set_num_threads(os.cpu_count() or 1)
+        self.torch = torch
+        self.tts = TTS(model_name).to(device)
+        self.model = self.tts.synthesizer.tts_model
+        self.sample_rate = self.tts.synthesizer.output_sample_rate
+        # XTTS can condition on precomputed speaker latents; other models cannot
+        self.has_latents = hasattr(self.model, 'get_conditioning_latents')
+        self.speakers = {}
+
+    def speaker(self, speaker_wav):
+        """Conditioning latents for a speaker, computed once per file"""
+        if speaker_wav not in self.speakers:
+            if len(self.speakers) >= 8:
+                self.speakers.pop(next(iter(self.speakers)))
+            self.speakers[speaker_wav] = self.model.get_conditioning_latents(audio_path=[speaker_wav])
+        return self.speakers[speaker_wav]
+
+    def synthesize(self, text, language, speaker_wav):
+        import numpy as np
+
+        language = MODEL_LANGUAGES.get(language, language)
+        with self.torch.inference_mode():
+            if self.has_latents:
+                gpt_cond_latent, speaker_embedding = self.speaker(speaker_wav)
+                wav = self.model.inference(text, language, gpt_cond_latent, speaker_embedding)['wav']
+            else:
+                wav = self.tts.tts(text=text, speaker_wav=speaker_wav, language=language)
+        if hasattr(wav, 'cpu'):
+            wav = wav.cpu().numpy()
+        return np.asarray(wav, dtype=np.float32)
+
+
+def _worker_main(model_name, device, requests, responses, batch_size, runner_factory=None):
+    """Worker process loop: load the model once, then answer batches of requests"""
+    try:
+        runner = (runner_factory or _ModelRunner)(model_name, device)
+    except Exception as e:
+        responses.put(('failed', f"Error loading TTS model: {str(e)}"))
+        return
+    responses.put(('ready', runner.sample_rate))
+
+    while True:
+        batch = [requests.get()]
+        # Take whatever else is already waiting, up to batch_size
+        while len(batch) < batch_size:
+            try:
+                batch.append(requests.get_nowait())
+            except queue.Empty:
+                break
+
+        # Identical lines queued together (short replies, repeated lyrics) are
+        # synthesized once; the audio cache only catches them once one has finished
+        stop = None in batch
+        waiting = {}
+        for request in batch:
+            if request is not None:
+                request_id, text, language, speaker_wav = request
+                waiting.setdefault((text, language, speaker_wav), []).append(request_id)
+        for (text, language, speaker_wav), request_ids in waiting.items():
+            try:
+                samples, error = runner.synthesize(text, language, speaker_wav), None
+            except Exception as e:
+                samples, error = None, str(e)
+            for request_id in request_ids:
+                responses.put(('result', request_id, samples, error))
+        if stop:
+            return
+
+
+class VoiceCloneWorker:
+    """Long-lived process that keeps a voice-cloning TTS model loaded
+
+    The model loads in the background as soon as the worker is created, so
+    a UI can start it without blocking. synthesize() may be called from
+    several threads. The model runs one text at a time, since XTTS has no
+    batched inference, and each speaker's conditioning latents are computed
+    once per file and reused. Requests waiting together are taken as one
+    batch, in which identical lines are synthesized only once.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, device="cpu", batch_size=8, runner_factory=None):
+        self.model_name = model_name
+        self.sample_rate = None
+        self.error = None
+        self._ready = threading.Event()
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+        context = multiprocessing.get_context('spawn')
+        self._requests = context.Queue()
+        self._responses = context.Queue()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(model_name, device, self._requests, self._responses, batch_size, runner_factory),
+            daemon=True)
+        self.process.start()
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def _dispatch(self):
+        """Hand worker responses to the waiting futures"""
+        while True:
+            try:
+                message = self._responses.get(timeout=1)
+            except queue.Empty:
+                if self.process.is_alive():
+                    continue
+                self._fail_all("Voice cloning worker stopped")
+                return
+
+            if message[0] == 'ready':
+                self.sample_rate = message[1]
+                self._ready.set()
+            elif message[0] == 'failed':
+                self._fail_all(message[1])
+                return
+            else:
+                _, request_id, samples, error = message
+                with self._lock:
+                    future = self._futures.pop(request_id, None)
+                if future is None:
+                    continue
+                if error:
+                    future.set_exception(Exception(error))
+                else:
+                    future.set_result(samples)
+
+    def _fail_all(self, message):
+        self.error = message
+        self._ready.set()
+        with self._lock:
+            futures, self._futures = self._futures, {}
+        for future in futures.values():
+            future.set_exception(Exception(message))
+
+    def wait_ready(self, timeout=None):
+        """Block until the model is loaded; raises if loading failed"""
+        self._ready.wait(timeout)
+        if self.error:
+            raise Exception(self.error)
+        return self._ready.is_set()
+
+    def synthesize(self, text, language, speaker_wav):
+        """Mono float32 samples at self.sample_rate"""
+        self.wait_ready()
+        future = Future()
+        with self._lock:
+            if self.error:
+                raise Exception(self.error)
+            request_id = next(self._ids)
+            self._futures[request_id] = future
+        self._requests.put((request_id, text, language, speaker_wav))
+        return future.result()
+
+    def close(self):
+        if self.process.is_alive():
+            self._requests.put(None)
+            self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class VoiceCloneBackend:
+    """TTS backend that speaks in the voice of speaker_wav through a VoiceCloneWorker"""
+
+    def __init__(self, worker, speaker_wav):
+        self.worker = worker
+        self.speaker_wav = os.path.abspath(speaker_wav)
+        self.name = f"clone:{worker.model_name}"
+        # Cached audio is only valid for this exact recording
+        self.voice = fingerprint(self.speaker_wav)
+
+    def synthesize(self, text, lang):
+        import soundfile as sf
+
+        samples = self.worker.synthesize(text, lang, self.speaker_wav)
+        buffer = io.BytesIO()
+        sf.write(buffer, samples, self.worker.sample_rate, format='WAV', subtype='FLOAT')
+        return buffer.getvalue()
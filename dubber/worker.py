@@ -0,0 +1,172 @@
+"""Headless worker that runs dubbing tasks from a JobQueue until stopped
+
+    python -m dubber URL ... -o output_dir --queue jobs.sqlite3
+    python -m dubber.worker jobs.sqlite3
+    python -m dubber.worker jobs.sqlite3 --kinds download,translation
+    python -m dubber.worker jobs.sqlite3 --status
+
+Start as many workers as the machine can take, on one host or on several
+hosts that share the queue file, the output directory and the cache.
+"""
+
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+
+from .cli import close_voice_workers, run_job
+from .job_queue import TASK_KINDS, JobQueue
+from .pipeline import JobInputError
+
+
+def retryable(error):
+    """Whether running a failed task again might succeed"""
+    return not isinstance(error, (JobInputError, ValueError))
+
+
+class QueueWorker:
+    """Leases tasks, keeps their leases alive while they run and records the outcome
+
+    A task whose lease is lost is stopped and its outcome is not recorded,
+    since another worker may already be running it.
+    """
+
+    def __init__(self, queue, worker_id=None, kinds=None, lease_seconds=60.0, poll_interval=2.0,
+                 json_events=False, prometheus_path=None):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.json_events = json_events
+        self.prometheus_path = prometheus_path
+
+    def heartbeat(self, task, stop, lost):
+        """Renew the lease three times per lease period until stop is set; set lost if it cannot"""
+        while not stop.wait(self.lease_seconds / 3):
+            try:
+                held = self.queue.heartbeat(task, self.worker_id, self.lease_seconds)
+            except Exception as e:
+                # Unrenewed, the lease runs out and another worker takes the task
+                print(f"Could not renew the lease of task {task.id}: {e}", flush=True)
+                held = False
+            if not held:
+                print(f"Lost the lease of task {task.id}; stopping it", flush=True)
+                lost.set()
+                return
+
+    def run_task(self, task, cancel_check=None):
+        payload = task.payload
+        voice_clone = payload.get('voice_clone')
+        return run_job(payload['job'], payload.get('options'), self.json_events, self.prometheus_path,
+                       voice_clone=tuple(voice_clone) if voice_clone else None,
+                       rate_limits=payload.get('rate_limits'),
+                       stage=None if task.kind == 'dub' else task.kind,
+                       cancel_check=cancel_check)
+
+    def process(self, task):
+        """Run one leased task; returns whether it succeeded"""
+        url = task.payload['job']['url']
+        print(f"Task {task.id} ({task.kind}, attempt {task.attempts}/{task.max_attempts}): {url}",
+              flush=True)
+        stop = threading.Event()
+        lost = threading.Event()
+        threading.Thread(target=self.heartbeat, args=(task, stop, lost), daemon=True).start()
+        try:
+            result = self.run_task(task, lost.is_set)
+        except Exception as e:
+            stop.set()
+            if lost.is_set():
+                print(f"Task {task.id} stopped after losing its lease", flush=True)
+                return False
+            self.queue.fail(task, self.worker_id, str(e), retry=retryable(e))
+            print(f"Error: {url}: {e}", flush=True)
+            return False
+        stop.set()
+        if lost.is_set():
+            print(f"Task {task.id} finished after losing its lease; not recorded", flush=True)
+            return False
+        self.queue.complete(task, self.worker_id, result)
+        print(f"Done: {result}", flush=True)
+        return True
+
+    def run(self, max_tasks=None, exit_when_idle=False):
+        """Process tasks until max_tasks have run, or until the queue is empty with exit_when_idle"""
+        done = 0
+        while max_tasks is None or done < max_tasks:
+            task = self.queue.lease(self.worker_id, self.kinds, self.lease_seconds)
+            if task is None:
+                if exit_when_idle:
+                    counts = self.queue.counts()
+                    if not counts['queued'] and not counts['leased']:
+                        break
+                time.sleep(self.poll_interval)
+                continue
+            self.process(task)
+            done += 1
+        return done
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m dubber.worker",
+        description="Run dubbing tasks from a queue file filled by python -m dubber --queue")
+    parser.add_argument("queue", help="SQLite queue file")
+    parser.add_argument("--kinds", default=",".join(TASK_KINDS),
+                        help="task kinds this worker takes, e.g. download,translation for a "
+                             "host with a fast network (default: all)")
+    parser.add_argument("--lease", type=float, default=60,
+                        help="seconds a task stays leased without a heartbeat (default: 60)")
+    parser.add_argument("--poll", type=float, default=2,
+                        help="seconds between checks of an empty queue (default: 2)")
+    parser.add_argument("--max-tasks", type=int, default=None, help="exit after this many tasks")
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="exit once no task is queued or running instead of waiting for more")
+    parser.add_argument("--rollback-journal", action="store_true",
+                        help="when creating the queue, make it usable on a network filesystem "
+                             "shared by several hosts, where SQLite's WAL mode does not work")
+    parser.add_argument("--status", action="store_true",
+                        help="print the number of tasks in each state and the dead tasks, then exit")
+    parser.add_argument("--retry-dead", action="store_true",
+                        help="queue every dead task again, then exit")
+    parser.add_argument("--prometheus-file", default=None,
+                        help="keep running totals in this Prometheus text file")
+    parser.add_argument("--json-events", action="store_true",
+                        help="print progress as one JSON event per line instead of status lines")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = set(kinds) - set(TASK_KINDS)
+    if unknown:
+        print(f"Unknown task kinds: {', '.join(sorted(unknown))}")
+        return 2
+
+    queue = JobQueue(args.queue, journal_mode="DELETE" if args.rollback_journal else "WAL")
+    if args.status:
+        print(" ".join(f"{state}={count}" for state, count in queue.counts().items()))
+        for task_id, kind, key, attempts, error in queue.dead_letters():
+            print(f"dead {task_id} {kind} after {attempts} attempts: {error}")
+        return 0
+    if args.retry_dead:
+        print(f"Queued {queue.retry_dead()} dead tasks again")
+        return 0
+
+    worker = QueueWorker(queue, kinds=kinds, lease_seconds=args.lease, poll_interval=args.poll,
+                         json_events=args.json_events, prometheus_path=args.prometheus_file)
+    try:
+        worker.run(args.max_tasks, args.exit_when_idle)
+    except KeyboardInterrupt:
+        # The lease of the current task runs out and another worker takes it
+        pass
+    finally:
+        close_voice_workers()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import os
+import re
+import shutil
+import tempfile
+
+from .paths import default_scratch_dir
+
+_WORKSPACE_NAME = re.compile(r'^dubber-(\d+)-')
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_stale_workspaces(root):
+    """Delete workspaces left behind by processes that no longer exist"""
+    if os.name != 'posix':
+        return  # os.kill(pid, 0) would terminate the process on Windows
+    for name in os.listdir(root):
+        match = _WORKSPACE_NAME.match(name)
+        if match and not _process_alive(int(match.group(1))):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+class JobWorkspace:
+    """Private scratch directory for one job attempt, deleted when the job ends
+
+    Workspaces live under a configurable root, which can be a tmpfs such as
+    /dev/shm to keep intermediate audio off slow disks. Names carry the
+    process ID, so directories left by a killed process are removed the
+    next time a workspace is created under the same root.
+    """
+
+    def __init__(self, root=None, label="job"):
+        self.root = root or default_scratch_dir()
+        os.makedirs(self.root, exist_ok=True)
+        remove_stale_workspaces(self.root)
+        label = re.sub(r'[^\w.-]+', '_', label)[:40]
+        self.directory = tempfile.mkdtemp(prefix=f"dubber-{os.getpid()}-{label}-", dir=self.root)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def cleanup(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cleanup()
@@ -1,24 +1,16 @@
 import os
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import yt_dlp
-from deep_translator import GoogleTranslator
-import arabic_reshaper
-from bidi.algorithm import get_display
-from gtts import gTTS
-import subprocess
-import srt
-from datetime import timedelta
-import requests
-from PIL import Image, ImageTk
 import io
 import threading
-from langdetect import detect
-import time
-import json
-import numpy as np
-import soundfile as sf
-import shutil
+
+# yt_dlp, requests, PIL, langdetect and the Arabic text shaping libraries are
+# imported where they are first used, so the window appears without waiting for them
+from dubber import DubbingJob, DubbingPipeline, EventBus, EventQueue
+from dubber.http_session import shared_session
+from dubber.info_cache import shared_info_cache
+from dubber.subtitles import parse_timestamp
+from dubber.voice_clone import VoiceCloneBackend, VoiceCloneWorker
 
 class DubbingApp:
     def __init__(self, master):
@@ -38,8 +30,30 @@ class DubbingApp:
         self.current_thread = None
         self.is_processing = False
         self.use_voice_clone = tk.BooleanVar(value=False)
+        self.incremental = tk.BooleanVar(value=False)
+        self.preview_start = tk.StringVar(value="0:00")
+        self.preview_end = tk.StringVar(value="0:30")
         self.speaker_wav_path = tk.StringVar()
-        self.tts_model = None
+        self.voice_worker = None
+        # Info loaded here is reused when the same video is dubbed
+        self.info_cache = shared_info_cache()
+        # Resized thumbnails by URL
+        self.thumbnails = {}
+
+        # Worker threads publish events; the Tk main loop drains them in process_events
+        self.events = EventBus()
+        self.event_queue = self.events.subscribe(EventQueue())
+        self.event_handlers = {
+            'status': lambda event: self.update_status(event['message']),
+            'progress': lambda event: self.update_progress(event['value']),
+            'error': lambda event: self.handle_error(event['message']),
+            'done': lambda event: messagebox.showinfo("نجاح", "!تمت عملية الدبلجة بنجاح"),
+            'video_info': lambda event: self.update_video_info(event['info'], event['language'],
+                                                               event['thumbnail']),
+            'info_loaded': lambda event: self.update_ui_state(loading=False),
+            'finished': lambda event: self.finish_dubbing(),
+            'voice_clone_failed': lambda event: self.voice_clone_failed(event['message']),
+        }
         
         # Configure styles
         self.setup_styles()
@@ -53,6 +67,23 @@ class DubbingApp:
         # Bind cleanup to window close
         self.master.protocol("WM_DELETE_WINDOW", self.cleanup)
 
+        self.master.after(100, self.process_events)
+
+    def process_events(self):
+        """Apply events published by worker threads (runs on the Tk main loop)"""
+        try:
+            for event in self.event_queue.drain():
+                handler = self.event_handlers.get(event['type'])
+                if not handler:
+                    continue
+                try:
+                    handler(event)
+                except Exception as e:
+                    # One broken handler must not stop the updates that follow
+                    print(f"Error handling {event['type']} event: {e}")
+        finally:
+            self.master.after(100, self.process_events)
+
     def setup_styles(self):
         style = ttk.Style()
         style.configure("Header.TLabel", font=("Arial", 16, "bold"))
@@ -120,6 +151,11 @@ class DubbingApp:
         ttk.Label(sub_frame, text="Or enter subtitles manually:").pack(pady=(5, 0))
         self.sub_text = tk.Text(sub_frame, height=4, wrap=tk.WORD)
         self.sub_text.pack(fill=tk.X, pady=5)
+
+        # Keeps the mixed tracks so a run after fixing a line only re-dubs that line
+        self.incremental_check = ttk.Checkbutton(sub_frame, text="Re-dub only edited lines",
+                                                 variable=self.incremental)
+        self.incremental_check.pack(anchor=tk.W)
         
         # Language Options
         lang_frame = ttk.LabelFrame(self.main_container, text="Languages", padding="10")
@@ -176,6 +212,15 @@ class DubbingApp:
                                      state="disabled",
                                      style="Action.TButton")
         self.pause_button.pack(side=tk.LEFT, padx=5)
+
+        # Dub a short range first to check the voice and translation
+        self.preview_button = ttk.Button(btn_frame, text="Preview",
+                                         command=lambda: self.start_dubbing(preview=True),
+                                         style="Action.TButton")
+        self.preview_button.pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Entry(btn_frame, textvariable=self.preview_start, width=7).pack(side=tk.LEFT)
+        ttk.Label(btn_frame, text="-").pack(side=tk.LEFT, padx=2)
+        ttk.Entry(btn_frame, textvariable=self.preview_end, width=7).pack(side=tk.LEFT)
         
         # Status Label
         self.status_label = ttk.Label(self.main_container, 
@@ -203,9 +248,14 @@ class DubbingApp:
     def start_load_info(self):
         """Start loading video info in a separate thread"""
         if not self.is_processing:
+            # Read the widget here; the loading thread must not touch Tk
+            url = self.video_url.get().strip()
+            if not url:
+                self.handle_error("Please enter a video URL")
+                return
             self.is_processing = True
             self.update_ui_state(loading=True)
-            thread = threading.Thread(target=self.load_video_info)
+            thread = threading.Thread(target=self.load_video_info, args=(url,))
             thread.daemon = True
             thread.start()
 
@@ -214,6 +264,7 @@ class DubbingApp:
         state = "disabled" if loading else "normal"
         if hasattr(self, 'start_button'):
             self.start_button.configure(state=state)
+            self.preview_button.configure(state=state)
         # Only disable pause button if we're not in dubbing process
         if hasattr(self, 'pause_button') and not self.current_thread:
             self.pause_button.configure(state="disabled")
@@ -223,63 +274,80 @@ class DubbingApp:
         self.progress_var.set(value)
         if hasattr(self, 'progress_label'):
             self.progress_label.configure(text=f"{int(value)}%")
-        self.master.update_idletasks()  # Update UI without blocking
 
-    def load_video_info(self):
+    def load_video_info(self, url):
         """Load video information in a separate thread"""
         try:
-            url = self.video_url.get().strip()
-            if not url:
-                self.handle_error("Please enter a video URL")
-                return
+            self.events.publish('status', message="جاري تحميل معلومات الفيديو...")
+            info = self.info_cache.get(url)
+            if info is None:
+                import yt_dlp
+
+                ydl_opts = {
+                    'quiet': True,
+                    'no_warnings': True,
+                    'extract_flat': True,
+                    'writesubtitles': True,
+                    'skip_download': True
+                }
+
+                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                    info = ydl.extract_info(url, download=False)
+                self.info_cache.put(url, info)
+
+            # Detect the language and prepare the thumbnail here, so the main
+            # thread only has to fill in the widgets
+            description = info.get('description') or ''
+            language = self.detect_language(f"{info.get('title', '')} {description[:1000]}")
+            thumbnail = self.load_thumbnail(info.get('thumbnail'))
+
+            # The UI is updated from the main thread in process_events
+            self.events.publish('video_info', info=info, language=language, thumbnail=thumbnail)
 
-            self.update_status("جاري تحميل معلومات الفيديو...")
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': True,
-                'writesubtitles': True,
-                'skip_download': True
-            }
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # Use master.after to update UI from the main thread
-                self.master.after(0, lambda: self.update_video_info(info))
-                
         except Exception as e:
-            self.master.after(0, lambda: self.handle_error(str(e)))
+            self.events.publish('error', message=str(e))
         finally:
             self.is_processing = False
-            self.master.after(0, lambda: self.update_ui_state(loading=False))
+            self.events.publish('info_loaded')
+
+    def load_thumbnail(self, thumbnail_url):
+        """Download, decode and resize a thumbnail (called from the loading thread)"""
+        if not thumbnail_url:
+            return None
+        if thumbnail_url not in self.thumbnails:
+            try:
+                from PIL import Image
+
+                response = shared_session().get(thumbnail_url, timeout=10)
+                response.raise_for_status()
+                img = Image.open(io.BytesIO(response.content))
+                img = img.resize((200, 150), Image.Resampling.LANCZOS)
+            except Exception as e:
+                print(f"Error loading thumbnail: {e}")
+                return None
+            if len(self.thumbnails) >= 32:
+                self.thumbnails.clear()
+            self.thumbnails[thumbnail_url] = img
+        return self.thumbnails[thumbnail_url]
 
-    def update_video_info(self, info):
+    def update_video_info(self, info, detected_lang=None, thumbnail=None):
         """Update video information in the UI (called from main thread)"""
         self.title_label.config(text=info.get('title', 'N/A'))
         self.channel_label.config(text=f"Channel: {info.get('channel', 'N/A')}")
         self.desc_text.delete(1.0, tk.END)
         self.desc_text.insert(tk.END, info.get('description', 'N/A'))
         
-        # Try to detect language from title and description
-        text_for_detection = f"{info.get('title', '')} {info.get('description', '')}"
-        detected_lang = self.detect_language(text_for_detection)
         if detected_lang:
             self.source_language.set(detected_lang)
             self.source_lang_label.config(text=f"({detected_lang})")
         
-        # Load thumbnail
-        thumbnail_url = info.get('thumbnail')
-        if thumbnail_url:
-            try:
-                response = requests.get(thumbnail_url)
-                img = Image.open(io.BytesIO(response.content))
-                img = img.resize((200, 150), Image.Resampling.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                self.thumbnail_label.configure(image=photo)
-                self.thumbnail_label.image = photo
-            except Exception as e:
-                print(f"Error loading thumbnail: {e}")
+        if thumbnail is not None:
+            from PIL import ImageTk
+
+            # Tk images must be created on the main thread
+            photo = ImageTk.PhotoImage(thumbnail)
+            self.thumbnail_label.configure(image=photo)
+            self.thumbnail_label.image = photo
         
         self.update_status("تم تحميل معلومات الفيديو بنجاح")
         self.update_progress(10)
@@ -297,6 +365,7 @@ class DubbingApp:
     def detect_language(self, text):
         """Detect the language of the given text"""
         try:
+            from langdetect import detect
             return detect(text)
         except:
             return None
@@ -314,122 +383,7 @@ class DubbingApp:
             self.sub_text.delete(1.0, tk.END)
             self.sub_text.insert(tk.END, subtitle_content)
 
-    def download_video_with_info(self, url, output_path, subtitle_lang=None):
-        ydl_opts = {
-            'outtmpl': os.path.join(output_path, '%(title)s-%(id)s.%(ext)s'),
-            'format': 'bestvideo+bestaudio/best',
-            'writesubtitles': True,
-            'subtitleslangs': [subtitle_lang] if subtitle_lang else [],
-            'subtitlesformat': 'srt',
-            'merge_output_format': 'mp4',
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                video_path = ydl.prepare_filename(info)
-                subtitle_path = None
-                
-                # Look for the subtitle file
-                if subtitle_lang:
-                    subtitle_name = f"{os.path.splitext(video_path)[0]}.{subtitle_lang}.srt"
-                    if os.path.exists(subtitle_name):
-                        subtitle_path = subtitle_name
-                
-                return {
-                    'video_path': video_path,
-                    'audio_path': video_path,  # Same as video path since we merge them
-                    'subtitle_path': subtitle_path,
-                    'video_info': info
-                }
-        except Exception as e:
-            raise Exception(f"Error downloading video: {str(e)}")
-
-    def parse_subtitle_text(self, subtitle_text):
-        """Parse subtitle text to create SRT-like structure"""
-        try:
-            # Split text into lines
-            lines = subtitle_text.strip().split('\n')
-            subtitles = []
-            current_time = 0
-            
-            for i, line in enumerate(lines, 1):
-                if line.strip():  # Skip empty lines
-                    # Create artificial timing (3 seconds per line)
-                    start_time = timedelta(seconds=current_time)
-                    end_time = timedelta(seconds=current_time + 3)
-                    subtitles.append((start_time, end_time, line.strip()))
-                    current_time += 3
-            
-            return subtitles
-        except Exception as e:
-            raise Exception(f"Error parsing manual subtitles: {str(e)}")
-
-    def get_subtitles(self):
-        """Get subtitles from either manual input or file"""
-        # Check manual input first
-        manual_subs = self.sub_text.get("1.0", tk.END).strip()
-        if manual_subs:
-            return self.parse_subtitle_text(manual_subs)
-            
-        # If no manual input, try to get from downloaded subtitles
-        if hasattr(self, 'current_subtitle_path') and self.current_subtitle_path:
-            return self.parse_subtitle_file(self.current_subtitle_path)
-            
-        raise Exception("No subtitles available. Please either enter subtitles manually or ensure the video has subtitles.")
-
-    def parse_subtitle_file(self, subtitle_path):
-        """Parse SRT file into list of (start, end, text) tuples"""
-        try:
-            with open(subtitle_path, 'r', encoding='utf-8') as f:
-                subtitle_content = f.read()
-                
-            parsed = list(srt.parse(subtitle_content))
-            return [(sub.start, sub.end, sub.content) for sub in parsed]
-        except Exception as e:
-            raise Exception(f"Error parsing subtitle file: {str(e)}")
-
-    def synchronize_audio(self, original_audio_path, dubbed_segments, subtitle_info):
-        """
-        Modified version that uses ffmpeg directly for audio processing
-        """
-        try:
-            # Create a temporary directory for audio segments
-            temp_dir = "temp_audio_segments"
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # Save each dubbed segment as a separate file
-            segment_files = []
-            for i, ((start_time, end_time, _), segment) in enumerate(zip(subtitle_info, dubbed_segments)):
-                segment_path = os.path.join(temp_dir, f"segment_{i}.wav")
-                segment.export(segment_path, format="wav")
-                segment_files.append((segment_path, start_time, end_time))
-            
-            # Create a file list for ffmpeg
-            concat_file = "concat.txt"
-            with open(concat_file, "w") as f:
-                for segment_path, _, _ in segment_files:
-                    f.write(f"file '{segment_path}'\n")
-            
-            # Concatenate all segments using ffmpeg
-            output_path = "final_audio.wav"
-            subprocess.run([
-                'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
-                '-i', concat_file, '-c', 'copy', output_path
-            ], check=True)
-            
-            # Clean up temporary files
-            os.remove(concat_file)
-            for segment_path, _, _ in segment_files:
-                os.remove(segment_path)
-            os.rmdir(temp_dir)
-            
-            return output_path
-            
-        except Exception as e:
-            raise Exception(f"Error synchronizing audio: {str(e)}")
-
-    def start_dubbing(self):
+    def start_dubbing(self, preview=False):
         try:
             url = self.video_url.get().strip()
             output_dir = self.output_path.get().strip()
@@ -438,154 +392,84 @@ class DubbingApp:
             if not all([url, output_dir]):
                 self.handle_error("Please fill in all required fields")
                 return
+
+            preview_range = None
+            if preview:
+                try:
+                    preview_range = [parse_timestamp(self.preview_start.get()),
+                                     parse_timestamp(self.preview_end.get())]
+                except ValueError:
+                    self.handle_error("Enter the preview range as seconds or m:ss")
+                    return
+                if preview_range[1] <= preview_range[0]:
+                    self.handle_error("The preview must end after it starts")
+                    return
+
+            tts_backend = None
+            if self.use_voice_clone.get():
+                if not self.speaker_wav_path.get() or self.voice_worker is None:
+                    self.handle_error("Please select a speaker voice file")
+                    return
+                tts_backend = VoiceCloneBackend(self.voice_worker, self.speaker_wav_path.get())
             
             # Enable pause button and disable start button
             self.pause_button.configure(state="normal")
             self.start_button.configure(state="disabled")
+            self.preview_button.configure(state="disabled")
             
             # Reset pause state
             self.is_paused = False
+
+            # Read the widgets here; the worker thread must not touch Tk
+            job = DubbingJob(
+                url,
+                output_dir,
+                target_lang=target_lang,
+                source_lang=self.source_language.get().strip(),
+                subtitle_text=self.sub_text.get("1.0", tk.END).strip(),
+                preview=preview_range,
+            )
             
             # Start the dubbing process in a separate thread
-            self.current_thread = threading.Thread(target=self.dubbing_process)
+            self.current_thread = threading.Thread(target=self.dubbing_process,
+                                                   args=(job, tts_backend, self.incremental.get()))
             self.current_thread.start()
             
         except Exception as e:
             self.handle_error(str(e))
 
-    def dubbing_process(self):
-        """The main dubbing process."""
+    def dubbing_process(self, job, tts_backend=None, incremental=False):
+        """Run the dubbing pipeline; progress, errors and completion arrive as events."""
+        pipeline = DubbingPipeline(
+            events=self.events,
+            pause_check=lambda: self.is_paused,
+            tts_backend=tts_backend,
+            incremental=incremental,
+            info_cache=self.info_cache,
+        )
         try:
-            video_url = self.video_url.get().strip()
-            output_dir = self.output_path.get().strip()
-            target_lang = self.target_language.get().strip()
-            source_lang = self.source_language.get().strip()
-            
-            self.update_status("جاري تنزيل الفيديو...")
-            download_result = self.download_video_with_info(video_url, output_dir, source_lang)
-            self.current_subtitle_path = download_result['subtitle_path']
-            
-            self.update_progress(30)
-            self.update_status("جاري تحليل الترجمة...")
-            
-            try:
-                subtitle_info = self.get_subtitles()
-            except Exception as e:
-                self.handle_error(f"Error with subtitles: {str(e)}")
-                return
-            
-            if not subtitle_info:
-                self.handle_error("لم يتم العثور على ترجمة")
-                return
-            
-            self.update_progress(40)
-            self.update_status("جاري ترجمة النصوص...")
-            translator = GoogleTranslator(source=source_lang, target=target_lang)
-            translated_texts = [translator.translate(text) for _, _, text in subtitle_info]
-            
-            self.update_progress(50)
-            self.update_status("جاري تحويل النص إلى كلام...")
-            
-            # Create temp directory for segments
-            temp_dir = "temp_audio_segments"
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            wav_files = []
-            total_segments = len(translated_texts)
-            
-            for i, text in enumerate(translated_texts, 1):
-                while self.is_paused:
-                    time.sleep(0.1)
-                    continue
-
-                try:
-                    self.update_status(f"Converting text to speech ({i}/{total_segments})...")
-                    temp_mp3 = os.path.join(temp_dir, f"segment_{i}.mp3")
-                    temp_wav = os.path.join(temp_dir, f"segment_{i}.wav")
-                    
-                    # Generate speech using gTTS
-                    tts = gTTS(text=text, lang=target_lang, slow=False)
-                    tts.save(temp_mp3)
-                    
-                    # Convert MP3 to WAV using ffmpeg
-                    subprocess.run([
-                        'ffmpeg', '-y', '-i', temp_mp3,
-                        '-acodec', 'pcm_s16le',
-                        '-ar', '44100',
-                        temp_wav
-                    ], check=True)
-                    
-                    wav_files.append(temp_wav)
-                    os.remove(temp_mp3)  # Clean up MP3 file
-                    
-                    self.update_progress(50 + (20 * i / total_segments))
-
-                except Exception as e:
-                    self.handle_error(f"Error in speech generation: {str(e)}")
-                    shutil.rmtree(temp_dir, ignore_errors=True)
-                    return
-
-            self.update_progress(70)
-            self.update_status("جاري مزامنة الصوت...")
-
-            try:
-                final_audio_path = "temp_final_audio.wav"
-                
-                # Read the first file to get parameters
-                data, samplerate = sf.read(wav_files[0])
-                combined_data = data
-                
-                # Concatenate the rest of the files
-                for wav_file in wav_files[1:]:
-                    data, _ = sf.read(wav_file)
-                    combined_data = np.concatenate([combined_data, data])
-                
-                # Write the combined audio
-                sf.write(final_audio_path, combined_data, samplerate)
-
-                self.update_progress(80)
-                self.update_status("جاري إنشاء الفيديو النهائي...")
-
-                # Merge video with dubbed audio
-                output_video = os.path.join(output_dir, "dubbed_video.mp4")
-                subprocess.run([
-                    'ffmpeg', '-y',
-                    '-i', download_result['video_path'],
-                    '-i', final_audio_path,
-                    '-c:v', 'copy',
-                    '-c:a', 'aac',
-                    output_video
-                ], check=True)
-
-                # Clean up
-                os.remove(final_audio_path)
-                shutil.rmtree(temp_dir, ignore_errors=True)
-
-                self.update_progress(100)
-                self.update_status("!تمت عملية الدبلجة بنجاح")
-                messagebox.showinfo("نجاح", "!تمت عملية الدبلجة بنجاح")
-
-            except Exception as e:
-                self.handle_error(f"Error in audio processing: {str(e)}")
-                if os.path.exists(temp_dir):
-                    shutil.rmtree(temp_dir)
-                if os.path.exists(final_audio_path):
-                    os.remove(final_audio_path)
-
-        except Exception as e:
-            self.handle_error(str(e))
+            pipeline.run(job)
+        except Exception:
+            pass  # already published as an 'error' event
         finally:
-            self.pause_button.configure(state="disabled")
-            self.start_button.configure(state="normal")
-            self.current_thread = None
+            self.events.publish('finished')
+
+    def finish_dubbing(self):
+        """Reset the controls once the dubbing thread has ended"""
+        self.pause_button.configure(state="disabled")
+        self.start_button.configure(state="normal")
+        self.preview_button.configure(state="normal")
+        self.current_thread = None
 
     def update_status(self, message):
         """Update the status message in the UI."""
         if isinstance(message, str):
+            import arabic_reshaper
+            from bidi.algorithm import get_display
+
             message = arabic_reshaper.reshape(message)
             message = get_display(message)
         self.status_var.set(message)
-        self.master.update()
 
     def handle_error(self, message):
         """Handle and display error messages."""
@@ -593,31 +477,41 @@ class DubbingApp:
         messagebox.showerror("Error", message)
 
     def toggle_voice_clone(self):
-        """Enable/disable voice cloning related widgets and load/unload model"""
+        """Enable/disable voice cloning related widgets and start/stop the model worker"""
         if self.use_voice_clone.get():
             self.speaker_btn.configure(state="normal")
             self.load_tts_model()
         else:
             self.speaker_btn.configure(state="disabled")
-            if self.tts_model is not None:
-                del self.tts_model
-                self.tts_model = None
+            self.stop_voice_worker()
 
     def load_tts_model(self):
-        """Load the TTS model for voice cloning"""
-        try:
-            self.update_status("Loading TTS model...")
-            from TTS.api import TTS
-            
-            # Get path to best model for voice cloning
-            model_name = TTS.list_models()[0]  # Get first available model
-            self.tts_model = TTS(model_name)
-            
-            self.update_status("TTS model loaded successfully")
-        except Exception as e:
-            self.handle_error(f"Error loading TTS model: {str(e)}")
-            self.use_voice_clone.set(False)
-            self.speaker_btn.configure(state="disabled")
+        """Start the voice cloning worker; the model loads in its own process"""
+        if self.voice_worker is not None:
+            return
+        self.update_status("Loading TTS model...")
+        self.voice_worker = VoiceCloneWorker()
+
+        def wait_for_model(worker):
+            try:
+                worker.wait_ready()
+                self.events.publish('status', message="TTS model loaded successfully")
+            except Exception as e:
+                if self.voice_worker is worker:  # not stopped on purpose
+                    self.events.publish('voice_clone_failed', message=str(e))
+
+        threading.Thread(target=wait_for_model, args=(self.voice_worker,), daemon=True).start()
+
+    def voice_clone_failed(self, message):
+        self.handle_error(message)
+        self.use_voice_clone.set(False)
+        self.speaker_btn.configure(state="disabled")
+        self.stop_voice_worker()
+
+    def stop_voice_worker(self):
+        if self.voice_worker is not None:
+            self.voice_worker.close()
+            self.voice_worker = None
 
     def browse_speaker_voice(self):
         """Browse for speaker voice WAV file"""
@@ -630,8 +524,7 @@ class DubbingApp:
 
     def cleanup(self):
         """Clean up resources before closing"""
-        if self.tts_model is not None:
-            del self.tts_model
+        self.stop_voice_worker()
         self.master.destroy()
 
 def main():
@@ -0,0 +1,96 @@
+import zlib
+
+import numpy as np
+import soundfile as sf
+
+from dubber.incremental import TrackPatch, diff_placements, merge_intervals, overlaps, placement_key
+from dubber.mixer import TimelineMixer
+
+RATE = 8000
+
+
+def speech(text):
+    """Stand-in for TTS: the same text always gives the same audio"""
+    rng = np.random.default_rng(zlib.crc32(text.encode('utf-8')))
+    return rng.uniform(-0.6, 0.6, int(len(text) * RATE / 15)).astype(np.float32)
+
+
+def render(cues, duration):
+    """Full mix and [start, slot_end, text, translation, offset, end] per cue"""
+    mixer = TimelineMixer(RATE, duration)
+    rows = []
+    for start, slot_end, translation in cues:
+        offset, end = mixer.place(speech(translation), start, slot_end)
+        rows.append([start, slot_end, translation, translation, offset, end])
+    return mixer.finish(), rows
+
+
+def patch(old_rows, old_path, new_cues, duration, target_path):
+    """What the pipeline does for an incremental re-dub"""
+    keys = [placement_key(start, slot_end, translation) for start, slot_end, translation in new_cues]
+    matched, removed, added = diff_placements(old_rows, keys)
+    fitter = TimelineMixer(RATE, duration)
+    fitted = {index: fitter.fit(speech(new_cues[index][2]), *new_cues[index][:2]) for index in added}
+    placements = dict(matched)
+    placements.update({index: (offset, offset + len(data)) for index, (offset, data) in fitted.items()})
+
+    regions = merge_intervals(removed + [placements[index] for index in added])
+    track_patch = TrackPatch(fitter, regions)
+    for offset, data in fitted.values():
+        track_patch.add(offset, data)
+    for index, extent in matched.items():
+        if overlaps(extent, regions):
+            track_patch.place(speech(new_cues[index][2]), *new_cues[index][:2])
+    track_patch.write(old_path, target_path, fitter.length, block_size=RATE)
+    return added
+
+
+def test_patched_track_matches_a_full_render(tmp_path):
+    old_cues = [(0.0, 2.0, "first line of dialogue"), (1.8, 4.0, "an overlapping reply here"),
+                (4.0, 6.0, "a neighbour running into the next"), (5.0, 7.0, "a line that will change"),
+                (8.0, 9.0, "a line that goes away"), (10.0, 12.0, "the last line")]
+    new_cues = [old_cues[0], old_cues[1], old_cues[2], (5.0, 7.0, "a line that was changed"), old_cues[5],
+                (14.0, 15.5, "a line past the old end")]
+    old_track, old_rows = render(old_cues, 13.0)
+    old_path = str(tmp_path / "old.flac")
+    sf.write(old_path, old_track, RATE, subtype='PCM_16', format='FLAC')
+
+    added = patch(old_rows, old_path, new_cues, 16.0, str(tmp_path / "new.flac"))
+    assert added == [3, 5]
+
+    expected, _ = render(new_cues, 16.0)
+    patched, rate = sf.read(str(tmp_path / "new.flac"), dtype='float32')
+    assert rate == RATE and len(patched) == len(expected)
+    # Both are within PCM_16 rounding of the float mix
+    assert np.max(np.abs(patched - expected)) <= 1.5 / 32768
+
+
+def test_unchanged_audio_is_copied_exactly(tmp_path):
+    track = np.random.default_rng(0).uniform(-0.5, 0.5, 4 * RATE).astype(np.float32)
+    source = str(tmp_path / "old.flac")
+    sf.write(source, track, RATE, subtype='PCM_16', format='FLAC')
+    recorded, _ = sf.read(source, dtype='float32')
+
+    track_patch = TrackPatch(TimelineMixer(RATE, 4), [(RATE, 2 * RATE)])
+    track_patch.add(RATE // 2, np.full(RATE, 0.25, dtype=np.float32))
+    track_patch.write(source, str(tmp_path / "new.flac"), 4 * RATE, block_size=3000)
+    patched, _ = sf.read(str(tmp_path / "new.flac"), dtype='float32')
+
+    np.testing.assert_array_equal(patched[:RATE], recorded[:RATE])
+    np.testing.assert_array_equal(patched[2 * RATE:], recorded[2 * RATE:])
+    # Inside the region only the newly placed audio is heard, clipped to it
+    assert np.allclose(patched[RATE:RATE + RATE // 2], 0.25, atol=1 / 32768)
+    assert np.allclose(patched[RATE + RATE // 2:2 * RATE], 0.0)
+
+
+def test_diff_placements_matches_repeated_cues_once_each():
+    old = [[0, 1, "a", "A", 0, 10], [2, 3, "b", "B", 20, 30], [0, 1, "a", "A", 0, 10]]
+    keys = [placement_key(0, 1, "A"), placement_key(2, 3, "C")]
+    matched, removed, added = diff_placements(old, keys)
+    assert matched == {0: (0, 10)}
+    assert sorted(removed) == [(0, 10), (20, 30)]
+    assert added == [1]
+
+
+def test_merge_intervals():
+    assert merge_intervals([(5, 8), (0, 2), (1, 3), (8, 9), (4, 4)]) == [(0, 3), (5, 9)]
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+
+from dubber.job_queue import JobQueue, enqueue_job
+from dubber.pipeline import DubbingJob
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue.sqlite"), retry_delay=0.0)
+
+
+def test_same_key_is_queued_once(queue):
+    first = queue.enqueue('dub', {'n': 1}, key="video")
+    assert queue.enqueue('dub', {'n': 2}, key="video") == first
+    assert queue.counts()['queued'] == 1
+    assert queue.lease("w").payload == {'n': 1}
+
+
+def test_expired_lease_goes_to_the_next_worker(queue):
+    task_id = queue.enqueue('dub', {}, max_attempts=3)
+    task = queue.lease("crashed", lease_seconds=0.01)
+    time.sleep(0.02)
+    again = queue.lease("w2")
+    assert again.id == task_id and again.attempts == 2
+    # The first worker no longer holds the lease and cannot finish the task
+    assert not queue.heartbeat(task, "crashed")
+    assert not queue.complete(task, "crashed")
+    assert queue.complete(again, "w2")
+    assert queue.counts()['done'] == 1
+
+
+def test_expired_lease_on_the_last_attempt_is_dead(queue):
+    queue.enqueue('dub', {}, max_attempts=1)
+    queue.lease("crashed", lease_seconds=0.01)
+    time.sleep(0.02)
+    assert queue.lease("w2") is None
+    assert queue.dead_letters()[0][4] == 'lease expired'
+
+
+def test_heartbeat_extends_the_lease(queue):
+    queue.enqueue('dub', {})
+    task = queue.lease("w", lease_seconds=0.05)
+    assert queue.heartbeat(task, "w", lease_seconds=60)
+    time.sleep(0.06)
+    assert queue.lease("w2") is None
+    assert queue.complete(task, "w")
+
+
+def test_failures_retry_until_max_attempts(queue):
+    queue.enqueue('dub', {}, max_attempts=2)
+    task = queue.lease("w")
+    assert queue.fail(task, "w", "boom")
+    task = queue.lease("w")
+    assert task.attempts == 2
+    assert queue.fail(task, "w", "boom again")
+    assert queue.lease("w") is None
+    assert queue.dead_letters()[0][3:] == (2, "boom again")
+
+
+def test_permanent_failure_is_dead_at_once(queue):
+    queue.enqueue('dub', {}, max_attempts=5)
+    queue.fail(queue.lease("w"), "w", "no subtitles", retry=False)
+    assert queue.counts()['dead'] == 1
+
+
+def test_dependants_wait_for_their_dependencies(queue):
+    download = queue.enqueue('download', {})
+    dub = queue.enqueue('dub', {}, depends_on=[download])
+    assert queue.lease("w", kinds=['dub']) is None
+    task = queue.lease("w")
+    assert task.id == download
+    assert queue.lease("w2") is None
+    queue.complete(task, "w")
+    assert queue.lease("w2").id == dub
+
+
+def test_dependants_run_once_the_dependency_is_dead(queue):
+    download = queue.enqueue('download', {}, max_attempts=1)
+    dub = queue.enqueue('dub', {}, depends_on=[download])
+    queue.fail(queue.lease("w"), "w", "boom")
+    assert queue.lease("w").id == dub
+
+
+def test_dead_key_is_queued_again_in_place(queue):
+    download = queue.enqueue('download', {'try': 1}, key="download:v", max_attempts=1)
+    dub = queue.enqueue('dub', {}, key="dub:v", depends_on=[download])
+    queue.fail(queue.lease("w", kinds=['download']), "w", "boom")
+    assert queue.enqueue('download', {'try': 2}, key="download:v") == download
+    # The dub task waits for the new attempt instead of running on a dead dependency
+    task = queue.lease("w")
+    assert (task.id, task.payload, task.attempts) == (download, {'try': 2}, 1)
+    queue.complete(task, "w")
+    assert queue.lease("w").id == dub
+
+
+def test_retry_dead(queue):
+    task_id = queue.enqueue('dub', {}, max_attempts=1)
+    queue.fail(queue.lease("w"), "w", "boom")
+    assert queue.retry_dead() == 1
+    assert queue.lease("w").id == task_id
+
+
+def test_split_job_runs_its_stages_in_order(queue, tmp_path):
+    job = DubbingJob("https://example.com/v", str(tmp_path), target_langs=['ar', 'fr'])
+    dub = enqueue_job(queue, job, {'tts': 'gtts'}, split_stages=True)
+    kinds = []
+    while True:
+        task = queue.lease("w")
+        if task is None:
+            break
+        kinds.append(task.kind)
+        assert task.payload['job']['target_langs'] == ['ar', 'fr']
+        queue.complete(task, "w")
+    assert kinds == ['download', 'translation', 'dub']
+    assert enqueue_job(queue, job, {}, split_stages=True) == dub
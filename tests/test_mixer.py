@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from dubber.mixer import StreamingMixer, TimelineMixer, resample, time_compress
+
+RATE = 8000
+
+
+def segments(count=40, seed=1):
+    """(samples, start, slot end) in cue order, some longer than their slot and some overlapping"""
+    rng = np.random.default_rng(seed)
+    start = 0.0
+    result = []
+    for _ in range(count):
+        start += rng.uniform(0.0, 1.5)
+        slot = rng.uniform(0.3, 2.0)
+        data = rng.uniform(-0.8, 0.8, int(rng.uniform(0.2, 3.0) * RATE)).astype(np.float32)
+        result.append((data, start, start + slot))
+    return result, start + 2.0
+
+
+def stream(mixer_segments, duration, block_seconds):
+    blocks = []
+    mixer = StreamingMixer(RATE, duration, blocks.append, block_seconds=block_seconds)
+    for data, start, slot_end in mixer_segments:
+        # Segments come in cue order, so nothing before this start changes any more
+        mixer.flush_until(start)
+        mixer.place(data, start, slot_end)
+    mixer.finish()
+    return np.concatenate(blocks)
+
+
+@pytest.mark.parametrize('block_seconds', [0.25, 1, 10, 1000])
+def test_streaming_mixer_matches_timeline_mixer(block_seconds):
+    placed, duration = segments()
+    timeline = TimelineMixer(RATE, duration)
+    for data, start, slot_end in placed:
+        timeline.place(data, start, slot_end)
+    expected = timeline.finish()
+    streamed = stream(placed, duration, block_seconds)
+    assert len(streamed) == len(expected) == int(np.ceil(duration * RATE))
+    np.testing.assert_array_equal(streamed, expected)
+
+
+def test_flush_only_streams_whole_blocks_before_the_point():
+    blocks = []
+    mixer = StreamingMixer(RATE, 5, blocks.append, block_seconds=1)
+    mixer.place(np.ones(RATE // 2, dtype=np.float32), 0.5, 1.5)
+    mixer.flush_until(2.5)
+    assert [len(block) for block in blocks] == [RATE, RATE]
+    assert len(mixer.blocks) == 0
+
+
+def test_placing_into_streamed_audio_fails():
+    mixer = StreamingMixer(RATE, 5, lambda block: None, block_seconds=1)
+    mixer.flush_until(2)
+    with pytest.raises(Exception, match="already streamed"):
+        mixer.place(np.ones(100, dtype=np.float32), 1.5, 2)
+
+
+def test_mixer_without_a_sink_holds_its_blocks():
+    mixer = StreamingMixer(RATE, 3, None, block_seconds=1)
+    mixer.place(np.full(RATE, 0.5, dtype=np.float32), 0, 1)
+    mixer.flush_until(3)
+    assert mixer.next_block == 0
+    blocks = []
+    mixer.attach(blocks.append)
+    mixer.finish()
+    assert np.concatenate(blocks)[:RATE].tolist() == [0.5] * RATE
+
+
+def test_segment_longer_than_its_slot_is_compressed_up_to_max_speedup():
+    mixer = TimelineMixer(RATE, 10, max_speedup=1.5)
+    start, end = mixer.place(np.ones(3 * RATE, dtype=np.float32), 1, 2)
+    assert start == RATE
+    # 1.5x at most, so it runs 2 seconds instead of 1 and overlaps what follows
+    assert end - start == pytest.approx(2 * RATE, rel=0.01)
+
+
+def test_time_compress_shortens_by_ratio():
+    tone = np.sin(2 * np.pi * 440 * np.arange(4 * RATE) / RATE).astype(np.float32)
+    # Whole frames only, so the length is right to within one hop
+    assert abs(len(time_compress(tone, 2.0)) - 2 * RATE) <= 512
+    assert time_compress(tone, 1.0) is tone
+
+
+def test_resample():
+    assert len(resample(np.zeros(441, dtype=np.float32), 44100, 8000)) == 80
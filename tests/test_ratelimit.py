@@ -0,0 +1,160 @@
+import threading
+import time
+
+import pytest
+
+from dubber.ratelimit import BackendClient, CircuitBreaker, CircuitOpenError, classify, retry_after
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = Response(status_code, headers)
+
+
+def flaky(*errors, result="ok"):
+    """Callable that raises errors in turn, then returns result"""
+    errors = list(errors)
+    calls = []
+
+    def call():
+        calls.append(time.monotonic())
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    call.calls = calls
+    return call
+
+
+def client(**options):
+    options = dict(dict(rate=1000.0, max_concurrency=4, base_delay=0.001, max_delay=0.01), **options)
+    return BackendClient("test", **options)
+
+
+def test_classify():
+    assert classify(HTTPError(429)) == 'throttled'
+    assert classify(HTTPError(503)) == 'transient'
+    assert classify(HTTPError(408)) == 'transient'
+    assert classify(HTTPError(404)) == 'fatal'
+    assert classify(ConnectionError("reset")) == 'transient'
+    assert classify(ValueError("bad")) == 'fatal'
+
+
+def test_retry_after():
+    assert retry_after(HTTPError(429, {'Retry-After': '2'})) == 2.0
+    assert retry_after(HTTPError(429)) is None
+    assert retry_after(ValueError()) is None
+
+
+def test_transient_errors_are_retried():
+    backend = client()
+    fn = flaky(ConnectionError(), HTTPError(502))
+    assert backend.call(fn) == "ok"
+    assert len(fn.calls) == 3
+    assert backend.stats()['retried'] == 2
+    assert backend.stats()['failed'] == 0
+    assert backend.stats()['circuit'] == 'closed'
+
+
+def test_fatal_errors_are_not_retried():
+    backend = client()
+    fn = flaky(HTTPError(404))
+    with pytest.raises(HTTPError):
+        backend.call(fn)
+    assert len(fn.calls) == 1
+    assert backend.stats()['failed'] == 1
+
+
+def test_retries_run_out():
+    backend = client(retries=2, failure_threshold=10)
+    fn = flaky(*[ConnectionError()] * 5)
+    with pytest.raises(ConnectionError):
+        backend.call(fn)
+    assert len(fn.calls) == 3
+
+
+def test_throttling_halves_concurrency_and_honours_retry_after():
+    backend = client(max_delay=1.0)
+    fn = flaky(HTTPError(429, {'Retry-After': '0.2'}))
+    start = time.monotonic()
+    assert backend.call(fn) == "ok"
+    assert time.monotonic() - start >= 0.2
+    assert backend.stats()['throttled'] == 1
+    assert backend.limiter.limit < 4
+    # The service answered, so throttling does not count against the circuit
+    assert backend.breaker.failures == 0
+
+
+def test_open_circuit_fails_fast_once_retries_are_used():
+    backend = client(retries=0, failure_threshold=2, reset_timeout=60)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            backend.call(flaky(ConnectionError()))
+    fn = flaky()
+    with pytest.raises(CircuitOpenError) as raised:
+        backend.call(fn)
+    assert fn.calls == []
+    assert raised.value.remaining > 50
+    assert backend.stats()['circuit'] == 'open'
+
+
+def test_open_circuit_is_waited_out_as_a_retry():
+    backend = client(retries=3, failure_threshold=1, reset_timeout=0.1)
+    backend.breaker.on_failure()
+    assert backend.stats()['circuit'] == 'open'
+    start = time.monotonic()
+    assert backend.call(flaky()) == "ok"
+    assert time.monotonic() - start >= 0.09
+    assert backend.stats()['retried'] == 1
+    assert backend.stats()['circuit'] == 'closed'
+
+
+def test_concurrent_callers_survive_a_short_outage():
+    backend = client(retries=5, base_delay=0.05, max_delay=0.2, failure_threshold=5, reset_timeout=0.3)
+    outage = flaky(*[ConnectionError()] * 6)
+    lock = threading.Lock()
+
+    def call():
+        with lock:
+            return outage()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(backend.call(call))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert results == ["ok"] * 8
+    assert backend.stats()['circuit'] == 'closed'
+
+
+def test_half_open_allows_one_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.on_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call("svc")
+    time.sleep(0.06)
+    breaker.before_call("svc")  # the trial
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call("svc")
+    assert raised.value.remaining == 0
+    breaker.on_failure()
+    assert breaker.state == 'open'
+
+
+def test_abandoned_trial_is_replaced():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.on_failure()
+    time.sleep(0.06)
+    breaker.before_call("svc")  # a trial whose caller never reports back
+    time.sleep(0.06)
+    breaker.before_call("svc")
+    breaker.on_success()
+    assert breaker.state == 'closed'
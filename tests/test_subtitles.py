@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+import pytest
+
+from dubber.subtitles import normalize_cues
+
+
+def cues(*items):
+    return [(timedelta(seconds=start), timedelta(seconds=end), text) for start, end, text in items]
+
+
+def seconds(normalized):
+    return [(round(start.total_seconds(), 3), round(end.total_seconds(), 3), text)
+            for start, end, text in normalized]
+
+
+def test_rolling_captions_keep_only_the_new_words():
+    rolling = cues((0, 2, "so today we are"),
+                   (2, 4, "so today we are\ngoing to talk about"),
+                   (4, 6, "going to talk about\ncircuit breakers."))
+    assert seconds(normalize_cues(rolling)) == [
+        (0, 6, "so today we are going to talk about circuit breakers.")]
+
+
+def test_a_word_shared_at_a_boundary_is_dialogue():
+    dialogue = cues((0, 1.5, "We have to go."), (1.5, 3, "Go where?"))
+    assert [text for _, _, text in normalize_cues(dialogue)] == ["We have to go.", "Go where?"]
+
+
+def test_fragments_merge_into_a_sentence():
+    fragments = cues((0, 1, "This is"), (1.2, 2, "one sentence"), (2.1, 3, "split up."), (5, 6, "Later."))
+    assert seconds(normalize_cues(fragments)) == [
+        (0, 3, "This is one sentence split up."),
+        (5, 6, "Later.")]
+
+
+def test_merging_stops_at_max_duration_and_gaps():
+    spaced = cues((0, 4, "first part"), (4.2, 7, "second part"), (7.1, 9, "third part"), (12, 13, "after a gap"))
+    texts = [text for _, _, text in normalize_cues(spaced, max_duration=8.0)]
+    assert texts == ["first part second part", "third part", "after a gap"]
+
+
+def test_long_cues_are_split_with_time_shared_by_length():
+    text = "One sentence here. Another sentence follows it."
+    normalized = seconds(normalize_cues(cues((0, 20, text)), max_duration=8.0, max_chars=200))
+    assert [piece for _, _, piece in normalized] == ["One sentence here.", "Another sentence follows it."]
+    assert normalized[0][0] == 0 and normalized[-1][1] == 20
+    assert normalized[0][1] == pytest.approx(20 * 18 / 46, abs=0.001)
+    assert normalized[0][1] == normalized[1][0]
+
+
+def test_markup_and_empty_cues_are_dropped():
+    marked = cues((0, 1, "<i>Hello</i> {\\an8}there."), (1, 2, "<b> </b>"), (5, 6, "Bye."))
+    assert [text for _, _, text in normalize_cues(marked)] == ["Hello there.", "Bye."]
+
+
+def test_overlapping_cues_are_cut_back():
+    overlapping = cues((0, 3, "First line."), (2, 4, "Second line."))
+    normalized = seconds(normalize_cues(overlapping, max_gap=0))
+    assert normalized == [(0, 2, "First line."), (2, 4, "Second line.")]
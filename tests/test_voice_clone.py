@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from dubber.voice_clone import VoiceCloneBackend, VoiceCloneWorker
+
+
+class FakeRunner:
+    """Stands in for the TTS model; each sample is the number of the call that made it"""
+
+    def __init__(self, model_name, device):
+        self.sample_rate = 24000
+        self.calls = 0
+
+    def synthesize(self, text, language, speaker_wav):
+        if text == "boom":
+            raise RuntimeError("bad text")
+        if text == "slow":
+            time.sleep(1)
+        self.calls += 1
+        return np.full(240, self.calls, dtype=np.float32)
+
+
+class BrokenRunner:
+    def __init__(self, model_name, device):
+        raise ImportError("No module named 'TTS'")
+
+
+@pytest.fixture
+def worker():
+    worker = VoiceCloneWorker("fake", runner_factory=FakeRunner)
+    yield worker
+    worker.close()
+
+
+def test_worker_loads_and_synthesizes(worker):
+    assert worker.wait_ready(60)
+    assert worker.sample_rate == 24000
+    samples = worker.synthesize("hello", "ar", "speaker.wav")
+    assert samples.dtype == np.float32 and len(samples) == 240
+
+
+def test_synthesis_error_reaches_the_caller(worker):
+    with pytest.raises(Exception, match="bad text"):
+        worker.synthesize("boom", "ar", "speaker.wav")
+    # The worker keeps serving after a failed line
+    assert len(worker.synthesize("after", "ar", "speaker.wav")) == 240
+
+
+def test_identical_requests_in_a_batch_are_synthesized_once(worker):
+    worker.wait_ready(60)
+    with ThreadPoolExecutor(4) as pool:
+        # The slow line keeps the model busy while the others queue up as one batch
+        slow = pool.submit(worker.synthesize, "slow", "ar", "speaker.wav")
+        time.sleep(0.2)
+        same = [pool.submit(worker.synthesize, "same line", "ar", "speaker.wav") for _ in range(3)]
+        assert slow.result(60)[0] == 1
+        assert [future.result(60)[0] for future in same] == [2, 2, 2]
+
+
+def test_load_failure_is_reported():
+    worker = VoiceCloneWorker("fake", runner_factory=BrokenRunner)
+    try:
+        with pytest.raises(Exception, match="Error loading TTS model"):
+            worker.wait_ready(60)
+        with pytest.raises(Exception, match="Error loading TTS model"):
+            worker.synthesize("hello", "ar", "speaker.wav")
+    finally:
+        worker.close()
+
+
+def test_backend_returns_wav_bytes(worker, tmp_path):
+    speaker = tmp_path / "speaker.wav"
+    speaker.write_bytes(b"RIFF fake recording")
+    backend = VoiceCloneBackend(worker, str(speaker))
+    data = backend.synthesize("hello", "ar")
+    assert data.startswith(b"RIFF")
+    assert backend.name == "clone:fake"